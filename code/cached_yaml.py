@@ -0,0 +1,96 @@
+
+#############################################################################
+# Cache for information objects parsed from YAML database files
+#############################################################################
+
+# External imports
+import collections
+import os
+import threading
+import yaml
+
+# Debugging constants
+DO_DEBUG = False
+
+# Maximum number of parsed files kept in the cache; the least recently
+# used entry is evicted when the limit is exceeded
+CACHE_SIZE = 32
+
+
+#############################################################################
+# Cache storage
+#############################################################################
+
+# Parsed objects indexed by absolute file name, in least recently used
+# order; each entry is a tuple (file signature, parsed object), where the
+# signature is made of the file modification time in nanoseconds and the
+# file size
+_yaml_cache = collections.OrderedDict()
+
+# Lock serializing the parsing of files, since servers handle requests in
+# threads
+_yaml_cache_lock = threading.Lock()
+
+
+#############################################################################
+# Load an object of class cls from the YAML file yaml_file_name, reusing
+# the previously parsed object as long as the file was not modified
+# Return the object, or None in case of error
+#############################################################################
+def load_cached(yaml_file_name, cls):
+
+    # Use the absolute path as key, so that relative and absolute names
+    # of the same file share one entry
+    yaml_file_name = os.path.abspath(yaml_file_name)
+
+    # Get the signature of the file; the size is included so that quick
+    # successive writes within the timestamp granularity are detected
+    try:
+        stat_result = os.stat(yaml_file_name)
+        signature = (stat_result.st_mtime_ns, stat_result.st_size)
+    except OSError:
+        print ("* ERROR: cached_yaml: Cannot access file %s." % (yaml_file_name))
+        return None
+
+    # Entries are replaced as a whole, so an unchanged file is served
+    # without taking the lock
+    entry = _yaml_cache.get(yaml_file_name)
+    if entry and entry[0] == signature:
+        try:
+            _yaml_cache.move_to_end(yaml_file_name)
+        except KeyError:
+            pass
+        return entry[1]
+
+    # The lock is held while parsing, so that when the file changes
+    # concurrent callers wait for a single new object instead of each
+    # parsing the file again
+    with _yaml_cache_lock:
+        entry = _yaml_cache.get(yaml_file_name)
+        if entry and entry[0] == signature:
+            return entry[1]
+
+        if DO_DEBUG:
+            print ("* DEBUG: cached_yaml: Parse file %s." % (yaml_file_name))
+
+        # Parse the file into a new object; failures are not cached, so
+        # that the file is parsed again at the next call
+        obj = cls()
+        if not obj.parse_YAML_file(yaml_file_name):
+            return None
+
+        _yaml_cache[yaml_file_name] = (signature, obj)
+        _yaml_cache.move_to_end(yaml_file_name)
+        while len(_yaml_cache) > CACHE_SIZE:
+            _yaml_cache.popitem(last=False)
+
+    return obj
+
+
+#############################################################################
+# Check whether PyYAML was built with libyaml, so that the information
+# classes can parse files using the fast CSafeLoader
+# Return True if libyaml is available
+#############################################################################
+def libyaml_available():
+    return getattr(yaml, "__with_libyaml__", False)
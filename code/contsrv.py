@@ -7,48 +7,57 @@ import subprocess
 import os
 import sys
 import getopt
-from socketserver import ThreadingMixIn
+import re
+from threadpool import ThreadPoolMixIn
+import logsetup
 import query
 from storyboard import Storyboard
 
 # --- Modernized Logging Setup ---
 LOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cytrone_debug.log')
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+logsetup.setup_logging(LOG_FILE)
 logger = logging.getLogger(__name__)
 
 # --- Constants ---
 LOCAL_ADDRESS = "0.0.0.0"
 SERVER_PORT = 8084
+RESPONSE_BUFFER_SIZE = 64 * 1024  # Size of the buffer in which responses are assembled
 # ... (other constants remain the same)
 CYLMS_PATH = ""
 CYLMS_CONFIG = ""
+CYLMS_COMMAND = ()  # Resolved once at startup from CYLMS_PATH
+CYLMS_TIMEOUT = 60
+CYLMS_PIPE_BUFSIZE = 65536
+STREAM_CHUNK_SIZE = 65536
+
+# Pattern of the CyLMS output line that contains the activity id
+ACTIVITY_ID_PATTERN = re.compile(rb"activity_id=(.*)")
+
+# Precomputed response templates (encoded once at import time)
+RESPONSE_SUCCESS = f'[{{"{Storyboard.SERVER_STATUS_KEY}": "{Storyboard.SERVER_STATUS_SUCCESS}"}}]'.encode('utf-8')
+RESPONSE_SUCCESS_ID_PREFIX = f'[{{"{Storyboard.SERVER_STATUS_KEY}": "{Storyboard.SERVER_STATUS_SUCCESS}", "{Storyboard.SERVER_ACTIVITY_ID_KEY}": "'.encode('utf-8')
+RESPONSE_SUCCESS_ID_SUFFIX = b'"}]'
 
 class RequestHandler(BaseHTTPRequestHandler):
+    # Buffer the output, so that the response headers and body are sent
+    # together when the response is flushed after each request
+    wbufsize = RESPONSE_BUFFER_SIZE
+
     def log_message(self, format, *args):
-        logger.info(f"{self.client_address[0]} - {format % args}")
+        logger.info("%s - " + format, self.client_address[0], *args)
 
     def do_POST(self):
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
             params = query.Parameters(self)
-            logger.debug(f"Received POST request with params: {params.params}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Received POST request with params: %r", params.parameters)
 
             action = params.get(query.Parameters.ACTION)
-            range_id = params.get(query.Parameters.RANGE_ID)
-            description_file_content = params.get(query.Parameters.DESCRIPTION_FILE)
 
             if action == query.Parameters.UPLOAD_CONTENT:
                 self.handle_upload(params)
             else:
-                logger.warning(f"Unknown action received: {action}")
+                logger.warning("Unknown action received: %s", action)
                 self.send_error(400, "Invalid Action")
 
         except Exception as e:
@@ -57,59 +66,97 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def handle_upload(self, params):
         range_id = params.get(query.Parameters.RANGE_ID)
-        description_file_content = params.get(query.Parameters.DESCRIPTION_FILE)
         content_file_name = f"/tmp/tmp_content_description-{range_id}.yml"
 
-        with open(content_file_name, "w") as f:
-            f.write(description_file_content)
-        logger.info(f"Saved content description to {content_file_name}")
+        fd = os.open(content_file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        remaining = 0
+        try:
+            if params.body_stream:
+                # Copy the streamed description in chunks, without holding
+                # the whole file in memory; the copy stops early if the
+                # client closes the connection
+                remaining = params.body_length
+                while remaining > 0:
+                    chunk = params.body_stream.read(min(remaining, STREAM_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    os.write(fd, chunk)
+                    remaining -= len(chunk)
+            else:
+                # Write the description with a single unbuffered write() call
+                description_file_content = params.get(query.Parameters.DESCRIPTION_FILE)
+                view = memoryview(description_file_content.encode('utf-8'))
+                while view:
+                    view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
+        # A partial description must not be converted and uploaded
+        if remaining > 0:
+            os.unlink(content_file_name)
+            logger.error("Content description truncated (%d bytes missing)", remaining)
+            self.send_error(400, "Truncated Content Description")
+            return
+        logger.info("Saved content description to %s", content_file_name)
 
         cmd = [
-            "python3", "-u", os.path.join(CYLMS_PATH, "cylms.py"),
+            *CYLMS_COMMAND,
             "--convert-content", content_file_name,
             "--config-file", CYLMS_CONFIG,
             "--add-to-lms", range_id
         ]
 
-        logger.info(f"Executing CyLMS command: {' '.join(cmd)}")
+        logger.info("Executing CyLMS command: %s", " ".join(cmd))
         try:
-            process = subprocess.run(
-                cmd, capture_output=True, text=True, check=True, timeout=60
-            )
-            logger.debug(f"CyLMS stdout: {process.stdout}")
+            # Output is kept as raw bytes (no decoding while the thread
+            # waits), and the child does not inherit the server stdin
+            with self.server.long_running():
+                process = subprocess.run(
+                    cmd, stdin=subprocess.DEVNULL, capture_output=True, check=True,
+                    timeout=CYLMS_TIMEOUT, bufsize=CYLMS_PIPE_BUFSIZE
+                )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("CyLMS stdout: %s", process.stdout.decode('utf-8', errors='replace'))
             activity_id = self.extract_activity_id(process.stdout)
 
             if activity_id:
-                logger.info(f"Successfully created activity with ID: {activity_id}")
-                response_content = f'[{{"{Storyboard.SERVER_STATUS_KEY}": "{Storyboard.SERVER_STATUS_SUCCESS}", "{Storyboard.SERVER_ACTIVITY_ID_KEY}": "{activity_id}"}}]'
-                self.send_response(200)
-                self.send_header("Content-type", "application/json")
-                self.end_headers()
-                self.wfile.write(response_content.encode('utf-8'))
+                logger.info("Successfully created activity with ID: %s", activity_id)
+                response_content = b"".join((RESPONSE_SUCCESS_ID_PREFIX, activity_id.encode('utf-8'), RESPONSE_SUCCESS_ID_SUFFIX))
+                self.send_json_response(response_content)
             else:
                 logger.error("Failed to extract activity_id from CyLMS output.")
                 self.send_error(500, "LMS Upload Issue: No Activity ID")
 
         except subprocess.CalledProcessError as e:
-            logger.error(f"CyLMS execution failed with exit code {e.returncode}")
-            logger.error(f"CyLMS stderr: {e.stderr}")
-            logger.error(f"CyLMS stdout: {e.stdout}")
-            self.send_error(500, f"CyLMS Execution Failed: {e.stderr[:100]}")
+            logger.error("CyLMS execution failed with exit code %s", e.returncode)
+            stderr = e.stderr.decode('utf-8', errors='replace')
+            logger.error("CyLMS stderr: %s", stderr)
+            logger.error("CyLMS stdout: %s", e.stdout.decode('utf-8', errors='replace'))
+            self.send_error(500, f"CyLMS Execution Failed: {stderr[:100]}")
         except subprocess.TimeoutExpired:
             logger.error("CyLMS command timed out.")
             self.send_error(500, "CyLMS Timeout")
 
+    def send_json_response(self, body):
+        # The body is already encoded, so that its length is known and sent
+        # in the headers
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def extract_activity_id(self, output):
-        for line in output.splitlines():
-            if "activity_id=" in line:
-                return line.split("activity_id=")[1].strip()
+        match = ACTIVITY_ID_PATTERN.search(output)
+        if match:
+            return match.group(1).strip().decode('utf-8')
         return None
 
-class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+class ThreadedHTTPServer(ThreadPoolMixIn, HTTPServer):
     pass
 
 def main(argv):
-    global CYLMS_PATH, CYLMS_CONFIG
+    global CYLMS_PATH, CYLMS_CONFIG, CYLMS_COMMAND
     # ... (getopt parsing remains the same)
     try:
         opts, args = getopt.getopt(argv, "hnp:c:", ["help", "no-lms", "path=", "config="])
@@ -125,6 +172,7 @@ def main(argv):
     if not CYLMS_PATH or not CYLMS_CONFIG:
         logger.error("CYLMS_PATH and CYLMS_CONFIG must be provided.")
         sys.exit(1)
+    CYLMS_COMMAND = ("python3", "-u", os.path.join(CYLMS_PATH, "cylms.py"))
 
     server = ThreadedHTTPServer((LOCAL_ADDRESS, SERVER_PORT), RequestHandler)
     logger.info(f"CyTrONE content server starting on {LOCAL_ADDRESS}:{SERVER_PORT}")
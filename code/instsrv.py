@@ -11,11 +11,25 @@ import random
 import os
 import sys
 import getopt
-from socketserver import ThreadingMixIn
+import subprocess
 import urllib
+# Use orjson to encode JSON data if available, since it is much faster
+# (its output is compact and not limited to ASCII)
+try:
+    from orjson import dumps as orjson_dumps
+    def json_dumps(obj):
+        return orjson_dumps(obj).decode('utf-8')
+except ImportError:
+    from json import dumps as json_dumps
+import functools
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Internal imports
 import userinfo
+import cached_yaml
+from threadpool import ThreadPoolMixIn, serve_forever_forked
 import query
 from storyboard import Storyboard
 
@@ -32,6 +46,8 @@ SERVER_ERROR  = 500
 LOCAL_SERVER  = True
 SERVE_FOREVER = True # Use serve count if not using local server?!
 ENABLE_THREADS = True
+SERVER_PROCESSES = 1 # Number of pre-forked server processes (threading mode only)
+RESPONSE_BUFFER_SIZE = 64 * 1024 # Size of the buffer in which responses are assembled
 
 # Names of files containing training-related information
 USERS_FILE  = "users.yml"
@@ -40,6 +56,7 @@ USERS_FILE  = "users.yml"
 SEPARATOR = "-----------------------------------------------------------------"
 DATABASE_DIR = "../database/"
 RANGE_DESCRIPTION_TEMPLATE = "tmp_range_description-{0}.yml"
+USERS_PATH = DATABASE_DIR + USERS_FILE
 
 # CyRIS related constants
 DEFAULT_CYRIS_PATH = "/home/cyuser/cyris/"
@@ -48,6 +65,7 @@ CYRIS_RANGE_DIRECTORY = "cyber_range/" # TODO: This should also be provided as a
 CYRIS_STATUS_FILENAME = "cr_creation_status"
 CYRIS_NOTIFICATION_TEMPLATE = "range_notification-cr{0}.txt"
 CYRIS_NOTIFICATION_SIMULATED = "range_notification-simulated.txt"
+SIMULATED_NOTIFICATION_PATH = DATABASE_DIR + CYRIS_NOTIFICATION_SIMULATED
 CYRIS_DETAILS_TEMPLATE = "range_details-cr{0}.yml"
 CYRIS_ENTRY_POINT_TEMPLATE = "entry_points.txt"
 CYRIS_CREATION_STATUS_TEMPLATE = "cr_creation_status"
@@ -56,10 +74,16 @@ CYRIS_CREATION_LOG_TEMPLATE = "creation.log"
 #CYRIS_DESTRUCTION_SCRIPT = "whole-controlled-destruction.sh"
 CYRIS_DESTRUCTION_SCRIPT = "main/range_cleanup.py"
 CYRIS_CONFIG_FILENAME = "CONFIG"
+CYRIS_MAIN_PATH = "" # Full paths, computed from CYRIS_PATH at startup
+CYRIS_CONFIG_PATH = ""
+CYRIS_DESTRUCTION_PATH = ""
+CYRIS_RANGE_PATH = "" # Directory containing the cyber range directories
+CYRIS_SUCCESS_TOKEN = Storyboard.SERVER_STATUS_SUCCESS.encode() # Looked for in the CyRIS status file
 
 # CyPROM related constants
 DEFAULT_CYPROM_PATH = "/home/cyuser/cyprom/"
 CYPROM_PATH = ""
+CYPROM_MAIN_PATH = "" # Full path, computed from CYPROM_PATH at startup
 
 SIMULATION_DURATION = -1 # Use -1 for random delay, positive value for fixed delay
 SIMULATION_RAND_MIN = 1 # Minimum limit for the random delay range
@@ -78,38 +102,258 @@ CYRIS_MASTER_HOST = "172.16.1.7"
 CYRIS_MASTER_ACCOUNT = "cyuser"
 CNT2LMS_PATH = "/home/cyuser/cylms/"
 
+# Flags used to open CyRIS output files for reading; O_NOATIME (Linux only)
+# avoids an inode update each time a file is served
+READ_FILE_FLAGS = os.O_RDONLY | getattr(os, "O_NOATIME", 0)
+
+# CyRIS output files returned together by the bundle action, indexed by
+# the name of the action that returns each of them separately
+CYRIS_BUNDLE_TEMPLATES = {
+    query.Parameters.GET_CR_NOTIFICATION: CYRIS_NOTIFICATION_TEMPLATE,
+    query.Parameters.GET_CR_DETAILS: CYRIS_DETAILS_TEMPLATE,
+    query.Parameters.GET_CR_ENTRY_POINT: CYRIS_ENTRY_POINT_TEMPLATE,
+    query.Parameters.GET_CR_CREATION_STATUS: CYRIS_CREATION_STATUS_TEMPLATE,
+    query.Parameters.GET_CR_INITIF: CYRIS_INITIF_TEMPLATE,
+    query.Parameters.GET_CR_CREATION_LOG: CYRIS_CREATION_LOG_TEMPLATE
+}
+
+# Thread pool shared by the requests that read the bundle files in
+# parallel, so that threads are not created for each request (they are
+# only started when first needed)
+CYRIS_BUNDLE_READER_POOL = ThreadPoolExecutor(max_workers=Storyboard.SERVER_MAX_WORKERS,
+                                              thread_name_prefix="CyrisBundleReader")
+
+# Maximum number of quoted CyRIS files kept in memory, and maximum size of
+# a file for it to be kept
+CYRIS_FILE_CACHE_SIZE = 1024
+CYRIS_FILE_CACHE_MAX_FILE_SIZE = 1024 * 1024
+
+# Reads of CyRIS files in progress, indexed by file name; each entry is a
+# tuple (event set when the read is done, list [quoted content, error])
+reads_in_flight = {}
+reads_in_flight_lock = threading.Lock()
+
+# Date and time string shown in log messages, as a tuple (second for
+# which it was built, string), so that it is formatted once per second
+log_date_time = (None, "")
+
+# Cached simulated notification, as a tuple (file signature, quoted content)
+simulated_notification_cache = None
+
+
+#############################################################################
+# Build the constant parts of a response with status status
+# Return a tuple (start of the response up to the message, complete
+# response without message)
+#############################################################################
+def build_response_parts(status):
+
+    response_status = f'"{Storyboard.SERVER_STATUS_KEY}": "{status}"'
+    return (f'[{{{response_status}, "{Storyboard.SERVER_MESSAGE_KEY}": "',
+            f'[{{{response_status}}}]')
+
+# Response parts for the usual statuses, and end of responses with message
+RESPONSE_PARTS = {status: build_response_parts(status)
+                  for status in (Storyboard.SERVER_STATUS_SUCCESS, Storyboard.SERVER_STATUS_ERROR)}
+RESPONSE_MESSAGE_SUFFIX = '"}]'
+
+
+#############################################################################
+# Build the name of a CyRIS output file for the cyber range with id
+# range_id, based on file_template
+#############################################################################
+def get_cyris_file_name(range_id, file_template):
+
+    # Most templates are plain file names, which need no substitution
+    if "{" in file_template:
+        file_template = file_template.format(range_id)
+
+    file_name = f"{CYRIS_RANGE_PATH}{range_id}/{file_template}"
+    if DEBUG:
+        print ("* DEBUG: instsrv: CyRIS file name=", file_name)
+
+    return file_name
+
+
+#############################################################################
+# Read the whole content of the file file_name as bytes, using the file
+# size to do so with a single read() call in most cases
+# Return the file content (raise OSError in case of error)
+#############################################################################
+def read_file_bytes(file_name):
+
+    try:
+        fd = os.open(file_name, READ_FILE_FLAGS)
+    except PermissionError:
+        # O_NOATIME is only allowed for the file owner
+        fd = os.open(file_name, os.O_RDONLY)
+
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+
+        # Very large files may need several read() calls
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+
+        return data
+    finally:
+        os.close(fd)
+
+
+#############################################################################
+# Read a CyRIS output file for the cyber range with id range_id, the file
+# name being built from file_template
+# Return the URL-quoted file content (raise IOError in case of error)
+#############################################################################
+def read_cyris_file(range_id, file_template):
+
+    file_name = get_cyris_file_name(range_id, file_template)
+
+    # CyRIS files are not modified once written, so their quoted content
+    # is cached, the modification time and size being part of the key to
+    # detect when a file is written again; large files are not cached
+    stat_result = os.stat(file_name)
+    if stat_result.st_size > CYRIS_FILE_CACHE_MAX_FILE_SIZE:
+        return read_quoted_file_shared(file_name)
+    return read_quoted_file(file_name, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+#############################################################################
+# Read and quote the file file_name, whose modification time and size are
+# given as arguments so that they are part of the cache key
+# Return the URL-quoted file content (raise OSError in case of error)
+#############################################################################
+@functools.lru_cache(maxsize=CYRIS_FILE_CACHE_SIZE)
+def read_quoted_file(file_name, mtime_ns, size):
+    return read_quoted_file_shared(file_name)
+
+
+#############################################################################
+# Read and quote the file file_name; concurrent calls for the same file
+# share a single read, the threads that arrive while the file is being
+# read waiting for its result instead of reading it again
+# Return the URL-quoted file content (raise OSError in case of error)
+#############################################################################
+def read_quoted_file_shared(file_name):
+
+    with reads_in_flight_lock:
+        read_entry = reads_in_flight.get(file_name)
+        first_reader = read_entry is None
+        if first_reader:
+            read_entry = (threading.Event(), [None, None])
+            reads_in_flight[file_name] = read_entry
+
+    (read_done, read_result) = read_entry
+
+    if first_reader:
+        try:
+            read_result[0] = urllib.parse.quote_from_bytes(read_file_bytes(file_name))
+        except Exception as error:
+            read_result[1] = error
+        finally:
+            # Later calls must read the file again, since it may change
+            with reads_in_flight_lock:
+                del reads_in_flight[file_name]
+            read_done.set()
+    else:
+        read_done.wait()
+
+    if read_result[1] is not None:
+        raise read_result[1]
+    return read_result[0]
+
+
+#############################################################################
+# Read the sample notification file used when simulating instantiation;
+# the quoted content is kept in memory and reused as long as the file
+# modification time and size are unchanged
+# Return the URL-quoted file content (raise IOError in case of error)
+#############################################################################
+def read_simulated_notification():
+
+    global simulated_notification_cache
+
+    stat_result = os.stat(SIMULATED_NOTIFICATION_PATH)
+    signature = (stat_result.st_mtime_ns, stat_result.st_size)
+
+    # The cache entry is replaced as a whole, so concurrent requests at
+    # worst read the file again
+    cache_entry = simulated_notification_cache
+    if cache_entry and cache_entry[0] == signature:
+        return cache_entry[1]
+
+    message = urllib.parse.quote_from_bytes(read_file_bytes(SIMULATED_NOTIFICATION_PATH))
+    simulated_notification_cache = (signature, message)
+
+    return message
+
 
 #############################################################################
 # Manage the instantiation server functionality
 #############################################################################
 class RequestHandler(BaseHTTPRequestHandler):
 
-    # List of valid actions recognized by this server
-    VALID_ACTIONS = [query.Parameters.INSTANTIATE_RANGE,
-                     query.Parameters.DESTROY_RANGE,
-                     query.Parameters.GET_CR_NOTIFICATION,
-                     query.Parameters.GET_CR_DETAILS,
-                     query.Parameters.GET_CR_ENTRY_POINT,
-                     query.Parameters.GET_CR_CREATION_STATUS,
-                     query.Parameters.GET_CR_INITIF,
-                     query.Parameters.GET_CR_CREATION_LOG]
+    # Buffer the output, so that the response headers and content are
+    # sent together when the response is flushed after each request,
+    # instead of with one system call each; responses written directly
+    # to the socket must flush the buffered headers first
+    wbufsize = RESPONSE_BUFFER_SIZE
 
     #########################################################################
     # Print log messages with custom format
     # Default format is shown below:
     #     127.0.0.1 - - [22/Jun/2016 14:47:56] "POST / HTTP/1.0" 200 -
     def log_message(self, format, *args):
+        global log_date_time
         (client_host, client_port) = self.client_address
+
+        # The date is formatted as by log_date_time_string(), but only
+        # when the second changes
+        now = int(time.time())
+        if log_date_time[0] != now:
+            year, month, day, hh, mm, ss, x, y, z = time.localtime(now)
+            log_date_time = (now, "%02d/%3s/%04d %02d:%02d:%02d" % (
+                day, self.monthname[month], year, hh, mm, ss))
+
         print("* INFO: instsrv: Server response to client %s - - [%s] %s" %
-              (client_host, self.log_date_time_string(), format%args))
+              (client_host, log_date_time[1], format%args))
 
     #########################################################################
-    # Execute shell commands
-    #def execute_command(self, command):
-    #    p = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    #    with open("log.txt", "a") as myfile:
-    #        for line in p.stdout.readlines():
-    #            myfile.write(line)
+    # Return a context manager to be used around long-running operations,
+    # so that meanwhile the server can handle other requests in the
+    # thread pool (if any)
+    def long_running(self):
+        if isinstance(self.server, ThreadPoolMixIn):
+            return self.server.long_running()
+        return contextlib.nullcontext()
+
+    #########################################################################
+    # Execute a command given as an argument list, without using a shell;
+    # the command output goes to the server output, as before
+    # Return the exit status of the command
+    def execute_command(self, argv):
+        try:
+            with self.long_running():
+                return subprocess.run(argv, stdin=subprocess.DEVNULL).returncode
+        except OSError as error:
+            print ("* ERROR: instsrv: Cannot execute command '%s': %s." % (argv[0], error))
+            return 127
+
+    #########################################################################
+    # Start a command given as an argument list in the background, in its
+    # own session so that it is not affected by the server
+    # Return True if the command could be started
+    def execute_command_background(self, argv):
+        try:
+            subprocess.Popen(argv, start_new_session=True, stdin=subprocess.DEVNULL)
+            return True
+        except OSError as error:
+            print ("* ERROR: instsrv: Cannot execute command '%s': %s." % (argv[0], error))
+            return False
 
     #########################################################################
     # Handle a POST message
@@ -125,9 +369,6 @@ class RequestHandler(BaseHTTPRequestHandler):
         # Get parameter values for given keys
         user_id = params.get(query.Parameters.USER)
         action = params.get(query.Parameters.ACTION)
-        description_file = params.get(query.Parameters.DESCRIPTION_FILE)
-        progression_scenario = params.get(query.Parameters.PROGRESSION_SCENARIO)
-        range_id = params.get(query.Parameters.RANGE_ID)
 
         if DEBUG:
             print (SEPARATOR)
@@ -135,9 +376,9 @@ class RequestHandler(BaseHTTPRequestHandler):
             print (SEPARATOR)
             print ("USER: %s" % (user_id))
             print ("ACTION: %s" % (action))
-            print ("DESCRIPTION FILE:\n%s" % (description_file))
-            print ("PROGRESSION_SCENARIO: %s" % (progression_scenario))
-            print ("RANGE_ID: %s" % (range_id))
+            print ("DESCRIPTION FILE:\n%s" % (params.get(query.Parameters.DESCRIPTION_FILE)))
+            print ("PROGRESSION_SCENARIO: %s" % (params.get(query.Parameters.PROGRESSION_SCENARIO)))
+            print ("RANGE_ID: %s" % (params.get(query.Parameters.RANGE_ID)))
             print (SEPARATOR)
 
         ## Handle user information
@@ -145,8 +386,8 @@ class RequestHandler(BaseHTTPRequestHandler):
         # Get user information from YAML file
         # Note: Only reading data that is (potentially) modified externally =>
         #       no need for synchronization
-        user_info = userinfo.UserInfo()
-        if not user_info.parse_YAML_file(DATABASE_DIR + USERS_FILE):
+        user_info = cached_yaml.load_cached(USERS_PATH, userinfo.UserInfo)
+        if not user_info:
             self.send_error(SERVER_ERROR, "User information issue")
             return
         if DEBUG:
@@ -160,386 +401,350 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         ## Handle action information
 
-        # Check that action is valid
-        if action not in self.VALID_ACTIONS:
+        # Check that action is valid, that is it has a handler
+        handler = self.ACTION_HANDLERS.get(action)
+        if not handler:
             self.send_error(REQUEST_ERROR, "Invalid action")
             return
 
         # If we reached this point, it means processing was successful
-        # => act according to each action
+        # => act according to each action; handlers return the response
+        # content, or None if they already sent an error
+        response_content = handler(self, params)
+        if response_content is None:
+            return
 
-        #############################################################################
-        # Instantiate the cyber range action
-        if action == query.Parameters.INSTANTIATE_RANGE: 
+        # Encode the response once, so that its length can be sent too
+        response_body = response_content.encode('utf-8')
 
-            # Check that description is not empty
-            if not description_file:
-                self.send_error(REQUEST_ERROR, "Invalid description file")
-                return
+        # Send response header to requester (triggers log_message())
+        self.send_response(HTTP_OK_CODE)
+        self.send_header("Content-type", "text/html")
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers() 
 
-            # Check that range id was provided
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
+        # Send scenario database content information to requester
+        self.wfile.write(response_body)
 
-            # Save the description received as a file
-            try:
-                range_file_name = RANGE_DESCRIPTION_TEMPLATE.format(range_id)
-                range_file = open(range_file_name, "w")
-                range_file.write(description_file)
-                range_file.close()
-                print ("* INFO: instsrv: Saved POSTed cyber range description to file '%s'." % (range_file_name))
-            except IOError:
-                print ("* ERROR: instsrv: Could not write to file %s." % (range_file_name))
-
-            print ("* INFO: instsrv: Start cyber range instantiation.")
-
-            # Use CyRIS to really do cyber range instantiation
-            if USE_CYRIS:
-                try:
-                    command = "python3 -u " + CYRIS_PATH + "main/cyris.py " + range_file_name + " " + CYRIS_PATH + CYRIS_CONFIG_FILENAME
-                    return_value = os.system(command)
-                    exit_status = os.WEXITSTATUS(return_value)
-                    if exit_status != 0:
-                        self.handle_cyris_error(range_id)
-                        self.send_error(SERVER_ERROR, "CyRIS execution issue")
-                        return
-
-                    status_filename = CYRIS_PATH + CYRIS_RANGE_DIRECTORY + str(range_id) + "/" + CYRIS_STATUS_FILENAME
-                    with open(status_filename, 'r') as status_file:
-                        status_file_content = status_file.read()
-                        if DEBUG:
-                            print ("* DEBUG: instsrv: Status file content=", status_file_content)
-                        if Storyboard.SERVER_STATUS_SUCCESS in status_file_content:
-
-                            # Get notification text
-                            notification_filename_short = CYRIS_NOTIFICATION_TEMPLATE.format(range_id) 
-                            notification_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                                           CYRIS_RANGE_DIRECTORY,
-                                                                           range_id,
-                                                                           notification_filename_short)
-                            if DEBUG:
-                                print ("* DEBUG: instsrv: Notification file name=", notification_filename)
-
-                            message = None
-                            with open(notification_filename, 'r') as notification_file:
-                                notification_file_content = notification_file.read()
-                                message = urllib.parse.quote(notification_file_content)
-
-                            response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-
-                            # We try to prepare the terminal for Moodle, but
-                            # errors are only considered as warnings for the
-                            # moment, since this functionality is not publicly
-                            # released yet in cnt2lms
-                            try:
-                                if USE_CNT2LMS_SCRIPT_GENERATION:
-                                    ssh_command = "ssh -tt -o 'ProxyCommand ssh cyuser@172.16.1.3 -W %h:%p' root@moodle"
-                                    python_command = "python3 -u " + CNT2LMS_PATH + "get_cyris_result.py " + CYRIS_MASTER_HOST + " " + CYRIS_MASTER_ACCOUNT + " " + CYRIS_PATH + CYRIS_RANGE_DIRECTORY + " " + range_id + " 1"
-                                    command = ssh_command + " \"" + python_command + "\""
-                                    print ("* DEBUG: instsrv: get_cyris_result command: " + command)
-                                    return_value = os.system(command)
-                                    exit_status = os.WEXITSTATUS(return_value)
-                                    if exit_status == 0:
-                                        #response_content = RESPONSE_SUCCESS
-                                        pass
-                                    else:
-                                        #self.send_error(SERVER_ERROR, "LMS terminal preparation issue")
-                                        #return
-                                        print ("* DEBUG: instsrv: LMS terminal preparation issue")
-                            except IOError:
-                                #self.send_error(SERVER_ERROR, "LMS terminal preparation I/O error)
-                                #return
-                                print ("* DEBUG: instsrv: LMS terminal preparation I/O error")
-
-                            # CyPROM related functionality
-                            if progression_scenario:
-
-                                print ("* INFO: instsrv: Run CyPROM using scenario '{}'".format(progression_scenario))
-
-                                # Build CyRIS details file name
-                                details_filename_short = CYRIS_DETAILS_TEMPLATE.format(range_id)
-                                details_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                                          CYRIS_RANGE_DIRECTORY,
-                                                                          range_id,
-                                                                          details_filename_short)
-                                # Build CyPROM command (note the background execution!)
-                                cyprom_command = "python3 -u {0}main/cyprom.py --scenario {1} --cyris {2} &".format(CYPROM_PATH, progression_scenario, details_filename)
-
-                                # Execute the command and handle the exit status
-                                return_value = os.system(cyprom_command)
-                                exit_status = os.WEXITSTATUS(return_value)
-                                if exit_status != 0:
-                                    self.handle_cyris_error(range_id)
-                                    self.send_error(SERVER_ERROR, "CyPROM execution issue")
-                                    return
-                        else:
-                            # Even though CyRIS is now destroying automatically the cyber range
-                            # in case of error, as this may fail, we still try to clean up here
-                            self.handle_cyris_error(range_id)
-                            response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                                   Storyboard.INSTANTIATION_STATUS_FILE_NOT_FOUND)
+        # Output server reply
+        if DEBUG:
+            print ("* DEBUG: instsrv: Server response content: %s" % (response_content))
+
+    #########################################################################
+    # Instantiate the cyber range action
+    def handle_instantiate_range(self, params):
+
+        description_file = params.get(query.Parameters.DESCRIPTION_FILE)
+        progression_scenario = params.get(query.Parameters.PROGRESSION_SCENARIO)
+        range_id = params.get(query.Parameters.RANGE_ID)
 
-                except IOError:
+        # Check that description is not empty
+        if not description_file:
+            self.send_error(REQUEST_ERROR, "Invalid description file")
+            return
+
+        # Check that range id was provided
+        if not range_id:
+            self.send_error(REQUEST_ERROR, "Invalid range id")
+            return
+
+        # Save the description received as a file; the file is written
+        # with unbuffered write() calls on the file descriptor
+        range_file_name = RANGE_DESCRIPTION_TEMPLATE.format(range_id)
+        try:
+            range_fd = os.open(range_file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                view = memoryview(description_file.encode('utf-8'))
+                while view:
+                    view = view[os.write(range_fd, view):]
+            finally:
+                os.close(range_fd)
+            print ("* INFO: instsrv: Saved POSTed cyber range description to file '%s'." % (range_file_name))
+        except OSError:
+            print ("* ERROR: instsrv: Could not write to file %s." % (range_file_name))
+
+        print ("* INFO: instsrv: Start cyber range instantiation.")
+
+        # Use CyRIS to really do cyber range instantiation
+        if USE_CYRIS:
+            try:
+                command = ["python3", "-u", CYRIS_MAIN_PATH, range_file_name, CYRIS_CONFIG_PATH]
+                exit_status = self.execute_command(command)
+                if exit_status != 0:
                     self.handle_cyris_error(range_id)
-                    self.send_error(SERVER_ERROR, Storyboard.INSTANTIATION_CYRIS_IO_ERROR)
+                    self.send_error(SERVER_ERROR, "CyRIS execution issue")
                     return
 
-            # Don't use CyRIS, just simulate the instantiation
-            else:
-                # Simulate time needed to instantiate the cyber range
-                if SIMULATION_DURATION == -1:
-                    sleep_time = random.randint(SIMULATION_RAND_MIN, SIMULATION_RAND_MAX)
-                else:
-                    sleep_time = SIMULATION_DURATION
-                print (Storyboard.SEPARATOR3)
-                print ("* INFO: instsrv: Simulate instantiation by sleeping %d s." % (sleep_time))
-                print (Storyboard.SEPARATOR3)
-                time.sleep(sleep_time)
+                # The creation status is always taken from the status file
+                # written by CyRIS
+                status_filename = f"{CYRIS_RANGE_PATH}{range_id}/{CYRIS_STATUS_FILENAME}"
+                status_file_content = read_file_bytes(status_filename)
+                if DEBUG:
+                    print ("* DEBUG: instsrv: Status file content=", status_file_content.decode(errors="replace"))
+
+                if CYRIS_SUCCESS_TOKEN in status_file_content:
+
+                    # Get notification text
+                    message = read_cyris_file(range_id, CYRIS_NOTIFICATION_TEMPLATE)
 
-                # Simulate the success or failure of the instantiation
-                if random.random() > 0.0:
-                    # Get sample notification text
-                    notification_filename = "{0}/{1}".format(DATABASE_DIR,
-                                                             CYRIS_NOTIFICATION_SIMULATED)
-                    if DEBUG:
-                        print ("* DEBUG: instsrv: Simulated notification file name=", notification_filename)
-
-                    message = None
-                    with open(notification_filename, 'r') as notification_file:
-                        notification_file_content = notification_file.read()
-                        message = urllib.parse.quote(notification_file_content)
                     response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
 
+                    # We try to prepare the terminal for Moodle, but
+                    # errors are only considered as warnings for the
+                    # moment, since this functionality is not publicly
+                    # released yet in cnt2lms
+                    try:
+                        if USE_CNT2LMS_SCRIPT_GENERATION:
+                            ssh_command = ["ssh", "-tt", "-o", "ProxyCommand ssh cyuser@172.16.1.3 -W %h:%p", "root@moodle"]
+                            python_command = "python3 -u " + CNT2LMS_PATH + "get_cyris_result.py " + CYRIS_MASTER_HOST + " " + CYRIS_MASTER_ACCOUNT + " " + CYRIS_RANGE_PATH + " " + range_id + " 1"
+                            command = ssh_command + [python_command]
+                            print ("* DEBUG: instsrv: get_cyris_result command: " + " ".join(command))
+                            exit_status = self.execute_command(command)
+                            if exit_status == 0:
+                                #response_content = RESPONSE_SUCCESS
+                                pass
+                            else:
+                                #self.send_error(SERVER_ERROR, "LMS terminal preparation issue")
+                                #return
+                                print ("* DEBUG: instsrv: LMS terminal preparation issue")
+                    except IOError:
+                        #self.send_error(SERVER_ERROR, "LMS terminal preparation I/O error)
+                        #return
+                        print ("* DEBUG: instsrv: LMS terminal preparation I/O error")
+
                     # CyPROM related functionality
                     if progression_scenario:
-                        print ("* INFO: instsrv: Simulated CyPROM execution using scenario '{}'.".format(progression_scenario))
 
-                else:
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                           Storyboard.INSTANTIATION_SIMULATED_ERROR)
+                        print ("* INFO: instsrv: Run CyPROM using scenario '{}'".format(progression_scenario))
 
-        #############################################################################
-        # Destroy the cyber range action
-        elif action == query.Parameters.DESTROY_RANGE: 
+                        # Build CyRIS details file name
+                        details_filename = get_cyris_file_name(range_id, CYRIS_DETAILS_TEMPLATE)
+                        # Build CyPROM command (note the background execution!)
+                        cyprom_command = ["python3", "-u", CYPROM_MAIN_PATH,
+                                          "--scenario", progression_scenario, "--cyris", details_filename]
 
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-
-            print ("* INFO: instsrv: Start destruction of cyber range with id %s." % (range_id))
-
-            # Use CyRIS to really do cyber range destruction
-            if USE_CYRIS:
-                destruction_filename = CYRIS_PATH + CYRIS_DESTRUCTION_SCRIPT
-                destruction_command = "{0} {1} {2}".format(destruction_filename, range_id, CYRIS_PATH + CYRIS_CONFIG_FILENAME)
-                print ("* DEBUG: instrv: destruction_command: " + destruction_command)
-                return_value = os.system(destruction_command)
-                exit_status = os.WEXITSTATUS(return_value)
-                if exit_status == 0:
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS)
+                        # Start the command and handle failures
+                        if not self.execute_command_background(cyprom_command):
+                            self.handle_cyris_error(range_id)
+                            self.send_error(SERVER_ERROR, "CyPROM execution issue")
+                            return
                 else:
+                    # Even though CyRIS is now destroying automatically the cyber range
+                    # in case of error, as this may fail, we still try to clean up here
+                    self.handle_cyris_error(range_id)
                     response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                           "CyRIS destruction issue")
+                                                           Storyboard.INSTANTIATION_STATUS_FILE_NOT_FOUND)
+
+            except IOError:
+                self.handle_cyris_error(range_id)
+                self.send_error(SERVER_ERROR, Storyboard.INSTANTIATION_CYRIS_IO_ERROR)
+                return
 
-            # Don't use CyRIS, just simulate the destruction
+        # Don't use CyRIS, just simulate the instantiation
+        else:
+            # Simulate time needed to instantiate the cyber range
+            if SIMULATION_DURATION == -1:
+                sleep_time = random.randint(SIMULATION_RAND_MIN, SIMULATION_RAND_MAX)
             else:
-                # Simulate time needed to destroy the cyber range
-                if SIMULATION_DURATION == -1:
-                    sleep_time = random.randint(SIMULATION_RAND_MIN, SIMULATION_RAND_MAX)
-                else:
-                    sleep_time = SIMULATION_DURATION
-                print (Storyboard.SEPARATOR3)
-                print ("* INFO: instsrv: Simulate destruction by sleeping %d s." % (sleep_time))
-                print (Storyboard.SEPARATOR3)
+                sleep_time = SIMULATION_DURATION
+            print ("%s\n* INFO: instsrv: Simulate instantiation by sleeping %d s.\n%s" % (
+                Storyboard.SEPARATOR3, sleep_time, Storyboard.SEPARATOR3))
+            with self.long_running():
                 time.sleep(sleep_time)
 
-                # Simulate the success or failure of the destruction
-                if random.random() > 0.0:
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS)
-                else:
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                           Storyboard.DESTRUCTION_SIMULATED_ERROR)
+            # Simulate the success or failure of the instantiation
+            if random.random() > 0.0:
+                # Get sample notification text
+                message = read_simulated_notification()
+                response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
 
-        elif action == query.Parameters.GET_CR_NOTIFICATION:
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-            # Get notification text
-            notification_filename_short = CYRIS_NOTIFICATION_TEMPLATE.format(range_id)
-            notification_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                           CYRIS_RANGE_DIRECTORY,
-                                                           range_id,
-                                                           notification_filename_short)
-            if DEBUG:
-                print ("* DEBUG: instsrv: Notification file name=", notification_filename)
-            message = None
-            try:
-                with open(notification_filename, 'r') as notification_file:
-                    notification_file_content = notification_file.read()
-                    message = urllib.parse.quote(notification_file_content)
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-            except:
-                response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                       "CyRIS range notification issue")
+                # CyPROM related functionality
+                if progression_scenario:
+                    print ("* INFO: instsrv: Simulated CyPROM execution using scenario '{}'.".format(progression_scenario))
 
-        elif action == query.Parameters.GET_CR_DETAILS:
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-            # Get range_details yml
-            range_details_filename_short = CYRIS_DETAILS_TEMPLATE.format(range_id)
-            range_details_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                            CYRIS_RANGE_DIRECTORY,
-                                                            range_id,
-                                                            range_details_filename_short)
-            if DEBUG:
-                print ("* DEBUG: instsrv: Notification file name=", range_details_filename)
-            message = None
-            try:
-                with open(range_details_filename, 'r') as range_details_file:
-                    range_details_file_content = range_details_file.read()
-                    message = urllib.parse.quote(range_details_file_content)
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-            except:
+            else:
                 response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                       "CyRIS range_details issue")
+                                                       Storyboard.INSTANTIATION_SIMULATED_ERROR)
 
-        elif action == query.Parameters.GET_CR_ENTRY_POINT:
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-            # Get entry_points txt
-            entry_points_filename_short = CYRIS_ENTRY_POINT_TEMPLATE.format(range_id)
-            entry_points_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                           CYRIS_RANGE_DIRECTORY,
-                                                           range_id,
-                                                           entry_points_filename_short)
-            if DEBUG:
-                print ("* DEBUG: instsrv: Entry_point file name=", entry_points_filename)
-            message = None
-            try:
-                with open(entry_points_filename, 'r') as entry_points_file:
-                    entry_points_file_content = entry_points_file.read()
-                    message = urllib.parse.quote(entry_points_file_content)
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-            except:
-                response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                       "CyRIS entry_points issue")
+        return response_content
 
-        elif action == query.Parameters.GET_CR_CREATION_STATUS:
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-            # Get entry_points txt
-            cr_creation_status_filename_short = CYRIS_CREATION_STATUS_TEMPLATE.format(range_id)
-            cr_creation_status_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                                 CYRIS_RANGE_DIRECTORY,
-                                                                 range_id,
-                                                                 cr_creation_status_filename_short)
-            if DEBUG:
-                print ("* DEBUG: instsrv: Cr_creation_status file name=", cr_creation_status_filename)
-            message = None
-            try:
-                with open(cr_creation_status_filename, 'r') as cr_creation_status_file:
-                    cr_creation_status_file_content = cr_creation_status_file.read()
-                    message = urllib.parse.quote(cr_creation_status_file_content)
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-            except:
+    #########################################################################
+    # Destroy the cyber range action
+    def handle_destroy_range(self, params):
+
+        range_id = params.get(query.Parameters.RANGE_ID)
+
+        # Check that the range id is valid
+        if not range_id:
+            self.send_error(REQUEST_ERROR, "Invalid range id")
+            return
+
+        print ("* INFO: instsrv: Start destruction of cyber range with id %s." % (range_id))
+
+        # The range id may be reused, so forget the files of all ranges
+        read_quoted_file.cache_clear()
+
+        # Use CyRIS to really do cyber range destruction
+        if USE_CYRIS:
+            destruction_command = [CYRIS_DESTRUCTION_PATH, range_id, CYRIS_CONFIG_PATH]
+            print ("* DEBUG: instrv: destruction_command: " + " ".join(destruction_command))
+            exit_status = self.execute_command(destruction_command)
+            if exit_status == 0:
+                response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS)
+            else:
                 response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                       "CyRIS cr_creation_status issue")
+                                                       "CyRIS destruction issue")
 
-        elif action == query.Parameters.GET_CR_INITIF:
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-            # Get entry_points txt
-            initif_filename_short = CYRIS_INITIF_TEMPLATE.format(range_id)
-            initif_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                     CYRIS_RANGE_DIRECTORY,
-                                                     range_id,
-                                                     initif_filename_short)
-            if DEBUG:
-                print ("* DEBUG: instsrv: Initif file name=", initif_filename)
-            message = None
-            try:
-                with open(initif_filename, 'r') as initif_file:
-                    initif_file_content = initif_file.read()
-                    message = urllib.parse.quote(initif_file_content)
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-            except:
+        # Don't use CyRIS, just simulate the destruction
+        else:
+            # Simulate time needed to destroy the cyber range
+            if SIMULATION_DURATION == -1:
+                sleep_time = random.randint(SIMULATION_RAND_MIN, SIMULATION_RAND_MAX)
+            else:
+                sleep_time = SIMULATION_DURATION
+            print ("%s\n* INFO: instsrv: Simulate destruction by sleeping %d s.\n%s" % (
+                Storyboard.SEPARATOR3, sleep_time, Storyboard.SEPARATOR3))
+            with self.long_running():
+                time.sleep(sleep_time)
+
+            # Simulate the success or failure of the destruction
+            if random.random() > 0.0:
+                response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS)
+            else:
                 response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                       "CyRIS initif issue")
+                                                       Storyboard.DESTRUCTION_SIMULATED_ERROR)
 
-        elif action == query.Parameters.GET_CR_CREATION_LOG:
-            # Check that the range id is valid
-            if not range_id:
-                self.send_error(REQUEST_ERROR, "Invalid range id")
-                return
-            # Get entry_points txt
-            creation_log_filename_short = CYRIS_CREATION_LOG_TEMPLATE.format(range_id)
-            creation_log_filename = "{0}{1}{2}/{3}".format(CYRIS_PATH,
-                                                           CYRIS_RANGE_DIRECTORY,
-                                                           range_id,
-                                                           creation_log_filename_short)
-            if DEBUG:
-                print ("* DEBUG: instsrv: CREATION_LOG file name=", creation_log_filename)
-            message = None
+        return response_content
+
+    #########################################################################
+    # Get the content of a CyRIS output file for a cyber range; the file
+    # name is built from file_template, and issue_message is returned
+    # in case the file cannot be read; if raw_allowed is True, the client
+    # may request the file to be sent as is instead of wrapped in JSON
+    def handle_get_cr_file(self, params, file_template, issue_message, raw_allowed=False):
+
+        range_id = params.get(query.Parameters.RANGE_ID)
+
+        # Check that the range id is valid
+        if not range_id:
+            self.send_error(REQUEST_ERROR, "Invalid range id")
+            return None
+
+        # Send the file directly if so requested
+        if raw_allowed and params.get(query.Parameters.RAW) == query.Parameters.RAW_ENABLED:
+            self.send_raw_file(get_cyris_file_name(range_id, file_template), issue_message)
+            return None
+
+        try:
+            message = read_cyris_file(range_id, file_template)
+            response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
+        except Exception:
+            response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR, issue_message)
+
+        return response_content
+
+    #########################################################################
+    # Get the content of all the CyRIS output files for a cyber range in
+    # one response; the message is a dictionary indexed by the action that
+    # returns each file separately, files that cannot be read being null
+    def handle_get_cr_bundle(self, params):
+
+        range_id = params.get(query.Parameters.RANGE_ID)
+
+        # Check that the range id is valid
+        if not range_id:
+            self.send_error(REQUEST_ERROR, "Invalid range id")
+            return None
+
+        # Read the files in parallel
+        futures = {action: CYRIS_BUNDLE_READER_POOL.submit(read_cyris_file, range_id, file_template)
+                   for action, file_template in CYRIS_BUNDLE_TEMPLATES.items()}
+
+        bundle = {}
+        for action, future in futures.items():
             try:
-                with open(creation_log_filename, 'r') as creation_log_file:
-                    creation_log_file_content = creation_log_file.read()
-                    message = urllib.parse.quote(creation_log_file_content)
-                    response_content = self.build_response(Storyboard.SERVER_STATUS_SUCCESS, message)
-            except:
-                response_content = self.build_response(Storyboard.SERVER_STATUS_ERROR,
-                                                       "CyRIS creation_log issue")
-        # Catch potential unimplemented actions (if any)
-        else:
-            print ("* WARNING: instsrv: Unknown action: %s." % (action))
+                bundle[action] = future.result()
+            except Exception:
+                bundle[action] = None
 
-        # Send response header to requester (triggers log_message())
-        self.send_response(HTTP_OK_CODE)
-        self.send_header("Content-type", "text/html")
-        self.end_headers() 
+        return json_dumps([{Storyboard.SERVER_STATUS_KEY: Storyboard.SERVER_STATUS_SUCCESS,
+                            Storyboard.SERVER_MESSAGE_KEY: bundle}])
 
-        # Send scenario database content information to requester
-        self.wfile.write(response_content.encode('utf-8'))
+    #########################################################################
+    # Send the file file_name as plain text response; the content is
+    # transferred by the kernel from the file to the socket (using
+    # sendfile where available), without being copied into the server
+    def send_raw_file(self, file_name, issue_message):
+        try:
+            cyris_file = open(file_name, 'rb')
+        except IOError:
+            self.send_error(SERVER_ERROR, issue_message)
+            return
 
-        # Output server reply
-        if DEBUG:
-            print ("* DEBUG: instsrv: Server response content: %s" % (response_content))
+        with cyris_file:
+            file_size = os.fstat(cyris_file.fileno()).st_size
+
+            # Send response header to requester (triggers log_message())
+            self.send_response(HTTP_OK_CODE)
+            self.send_header("Content-type", "text/plain")
+            self.send_header("Content-Length", str(file_size))
+            self.end_headers()
+
+            # The file is written directly to the socket, bypassing wfile,
+            # so the headers held in the wfile buffer must be flushed
+            # first; these two calls must stay in this order
+            self.wfile.flush()
+            self.connection.sendfile(cyris_file, 0, file_size)
 
     def build_response(self, status, message=None):
 
-        # Prepare status
-        response_status = '"{0}": "{1}"'.format(Storyboard.SERVER_STATUS_KEY, status)
+        # The constant parts of the response are built once per status, so
+        # that only the message is inserted here
+        response_parts = RESPONSE_PARTS.get(status) or build_response_parts(status)
 
         # If a message exists we append it to the status, otherwise we
         # make an array with a dictionary containing only the status
         if message:
-            response_message = '"{0}": "{1}"'.format(Storyboard.SERVER_MESSAGE_KEY, message)
-            response_body = '[{' + response_status + ", " + response_message + '}]'
-        else:
-            response_body = '[{' + response_status + '}]'
-
-        return response_body
+            return "".join((response_parts[0], message, RESPONSE_MESSAGE_SUFFIX))
+        return response_parts[1]
 
     def handle_cyris_error(self, range_id):
         print ("* INFO: Error occurred in CyRIS => perform cyber range cleanup.")
-        destruction_filename = CYRIS_PATH + CYRIS_DESTRUCTION_SCRIPT
-        destruction_command = "{0} {1} {2}".format(destruction_filename, range_id, CYRIS_PATH + CYRIS_CONFIG_FILENAME)
-        print ("* DEBUG: instrv: destruction_command: " + destruction_command)
-        return_value = os.system(destruction_command)
-        exit_status = os.WEXITSTATUS(return_value)
+        destruction_command = [CYRIS_DESTRUCTION_PATH, range_id, CYRIS_CONFIG_PATH]
+        print ("* DEBUG: instrv: destruction_command: " + " ".join(destruction_command))
+        exit_status = self.execute_command(destruction_command)
         if exit_status != 0:
             print ("* ERROR: instrv: Range cleanup failed.")
 
+    # Handlers of the valid actions recognized by this server; each handler
+    # is called as handler(self, params), the parameters specific to an
+    # action being bound in advance with functools.partial
+    ACTION_HANDLERS = {
+        query.Parameters.INSTANTIATE_RANGE: handle_instantiate_range,
+        query.Parameters.DESTROY_RANGE: handle_destroy_range,
+        query.Parameters.GET_CR_NOTIFICATION: functools.partial(handle_get_cr_file,
+                                                                file_template=CYRIS_NOTIFICATION_TEMPLATE,
+                                                                issue_message="CyRIS range notification issue"),
+        query.Parameters.GET_CR_DETAILS: functools.partial(handle_get_cr_file,
+                                                           file_template=CYRIS_DETAILS_TEMPLATE,
+                                                           issue_message="CyRIS range_details issue",
+                                                           raw_allowed=True),
+        query.Parameters.GET_CR_ENTRY_POINT: functools.partial(handle_get_cr_file,
+                                                               file_template=CYRIS_ENTRY_POINT_TEMPLATE,
+                                                               issue_message="CyRIS entry_points issue"),
+        query.Parameters.GET_CR_CREATION_STATUS: functools.partial(handle_get_cr_file,
+                                                                   file_template=CYRIS_CREATION_STATUS_TEMPLATE,
+                                                                   issue_message="CyRIS cr_creation_status issue"),
+        query.Parameters.GET_CR_INITIF: functools.partial(handle_get_cr_file,
+                                                          file_template=CYRIS_INITIF_TEMPLATE,
+                                                          issue_message="CyRIS initif issue"),
+        query.Parameters.GET_CR_CREATION_LOG: functools.partial(handle_get_cr_file,
+                                                                file_template=CYRIS_CREATION_LOG_TEMPLATE,
+                                                                issue_message="CyRIS creation_log issue",
+                                                                raw_allowed=True),
+        query.Parameters.GET_CR_BUNDLE: handle_get_cr_bundle
+    }
+
 # Print usage information
 def usage():
     print ("OVERVIEW: CyTrONE instantiation server that manages the CyRIS cyber range instantiation system.\n")
@@ -548,14 +753,14 @@ def usage():
     print ("-h, --help           Display help")
     print ("-n, --no-inst        Disable instantiation => only simulate actions")
     print ("-p, --path <PATH>    Set the location where CyRIS is installed")
-    print ("-m, --cyprom <PATH>  Set the location where CyPROM is installed\n")
+    print ("-m, --cyprom <PATH>  Set the location where CyPROM is installed")
+    print ("-j, --processes <N>  Set the number of pre-forked server processes\n")
 
 
-# Use threads to handle multiple clients
-# Note: By using ForkingMixIn instead of ThreadingMixIn,
-# separate processes are used instead of threads
-class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-    """Handle requests in a separate thread."""
+# Use threads from a bounded pool to handle multiple clients
+# Note: The pool size is set via Storyboard.SERVER_MAX_WORKERS
+class ThreadedHTTPServer(ThreadPoolMixIn, HTTPServer):
+    """Handle requests in threads from a bounded pool."""
 
 
 #############################################################################
@@ -566,10 +771,16 @@ def main(argv):
     global USE_CYRIS
     global CYRIS_PATH
     global CYPROM_PATH
+    global CYRIS_MAIN_PATH
+    global CYRIS_CONFIG_PATH
+    global CYRIS_DESTRUCTION_PATH
+    global CYRIS_RANGE_PATH
+    global CYPROM_MAIN_PATH
+    global SERVER_PROCESSES
 
     # Parse command line arguments
     try:
-        opts, args = getopt.getopt(argv, "hnp:m:", ["help", "no-inst", "path=", "cyprom="])
+        opts, args = getopt.getopt(argv, "hnp:m:j:", ["help", "no-inst", "path=", "cyprom=", "processes="])
     except getopt.GetoptError as err:
         print ("* ERROR: instsrv: Command-line argument error: %s" % (str(err)))
         usage()
@@ -584,6 +795,15 @@ def main(argv):
             CYRIS_PATH = arg
         elif opt in ("-m", "--cyprom"):
             CYPROM_PATH = arg
+        elif opt in ("-j", "--processes"):
+            try:
+                SERVER_PROCESSES = int(arg)
+            except ValueError:
+                SERVER_PROCESSES = 0
+            if SERVER_PROCESSES < 1:
+                print ("* ERROR: instsrv: Invalid number of processes: %s" % (arg))
+                usage()
+                sys.exit(1)
 
     # Assign default values to CYRIS_PATH and CYPROM_PATH if necessary
     if not CYRIS_PATH:
@@ -596,6 +816,13 @@ def main(argv):
     if not CYPROM_PATH.endswith("/"):
         CYPROM_PATH += "/"
 
+    # Compute once the full paths used when running CyRIS and CyPROM
+    CYRIS_MAIN_PATH = CYRIS_PATH + "main/cyris.py"
+    CYRIS_CONFIG_PATH = CYRIS_PATH + CYRIS_CONFIG_FILENAME
+    CYRIS_DESTRUCTION_PATH = CYRIS_PATH + CYRIS_DESTRUCTION_SCRIPT
+    CYRIS_RANGE_PATH = CYRIS_PATH + CYRIS_RANGE_DIRECTORY
+    CYPROM_MAIN_PATH = CYPROM_PATH + "main/cyprom.py"
+
     try:
 
         # Configure the web server
@@ -609,7 +836,10 @@ def main(argv):
         if ENABLE_THREADS:
             server = ThreadedHTTPServer((server_address, server_port),
                                         RequestHandler)
-            multi_threading = " (multi-threading mode)"
+            multi_threading = " (multi-threading mode"
+            if SERVER_PROCESSES > 1:
+                multi_threading += ", %d processes" % (SERVER_PROCESSES)
+            multi_threading += ")"
         else:
             server = HTTPServer((server_address, server_port), RequestHandler)
 
@@ -621,9 +851,20 @@ def main(argv):
         else:
             print ("* INFO: instsrv: Using CyRIS software installed in %s." % (CYRIS_PATH))
             print ("* INFO: instsrv: Using CyPROM software installed in %s." % (CYPROM_PATH))
+        if not cached_yaml.libyaml_available():
+            print ("* WARNING: instsrv: PyYAML lacks libyaml support => slow parsing of YAML files.")
+
+        # Parse the user information once at startup, so that requests
+        # (including those handled by forked processes) find it in the
+        # cache; it is parsed again only if the file changes
+        if not cached_yaml.load_cached(USERS_PATH, userinfo.UserInfo):
+            print ("* WARNING: instsrv: Cannot load user information from %s." % (USERS_PATH))
 
         if SERVE_FOREVER:
-            server.serve_forever()
+            if ENABLE_THREADS and SERVER_PROCESSES > 1:
+                serve_forever_forked(server, SERVER_PROCESSES)
+            else:
+                server.serve_forever()
         else:
             server.handle_request()
 
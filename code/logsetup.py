@@ -0,0 +1,53 @@
+
+#############################################################################
+# Logging configuration shared by CyTrONE servers
+#############################################################################
+
+# External imports
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Logging constants
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+
+#############################################################################
+# Configure the root logger so that request threads only enqueue log
+# records, while a background listener thread writes them to the log file
+# and to stdout; file output is rotated to bound its size, and written
+# as records arrive, so that nothing is lost if a server is killed; stdout
+# only shows messages of level INFO and above
+#############################################################################
+def setup_logging(log_file):
+
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(log_file,
+                                                        maxBytes=LOG_FILE_MAX_BYTES,
+                                                        backupCount=LOG_FILE_BACKUP_COUNT)
+    file_handler.setFormatter(formatter)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    stream_handler.setLevel(logging.INFO)
+
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler,
+                                              respect_handler_level=True)
+
+    # The queue handler only merges the message arguments; the actual
+    # formatting is done by the listener handlers
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.DEBUG, handlers=[queue_handler])
+
+    # Drain the queue at exit
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
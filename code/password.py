@@ -7,51 +7,45 @@
 import getpass
 import sys
 
-# Used by the passlib-based implementation (default, RECOMMENDED)
-from passlib.hash import pbkdf2_sha256
+# Passwords are hashed and verified using passlib
+from passlib.context import CryptContext
+from passlib.hash import argon2
 
-# Used by the built-in implementation (NOT recommended)
-import hashlib
-import random
+# Hashing schemes used with passlib; new passwords are hashed with Argon2
+# when the argon2-cffi backend is installed, since its compression function
+# runs in C; PBKDF2-HMAC-SHA256 remains supported, so that existing hashes
+# still verify
+if argon2.has_backend():
+    PASSLIB_SCHEMES = ["argon2", "pbkdf2_sha256"]
+else:
+    PASSLIB_SCHEMES = ["pbkdf2_sha256"]
 
-class Password:
+# Argon2id parameters (memory cost in KiB)
+ARGON2_MEMORY_COST = 65536
+ARGON2_TIME_COST = 3
+ARGON2_PARALLELISM = 1
+
+PASSWORD_CONTEXT = CryptContext(schemes=PASSLIB_SCHEMES, deprecated="auto",
+                                argon2__type="ID",
+                                argon2__memory_cost=ARGON2_MEMORY_COST,
+                                argon2__time_cost=ARGON2_TIME_COST,
+                                argon2__parallelism=ARGON2_PARALLELISM)
 
-    # Use this field to control whether passlib is used or not
-    USE_PASSLIB = True
+class Password:
 
     # Encode a given raw password
     # Return the encrypted password
     @classmethod
     def encode(cls, raw_password):
-        if cls.USE_PASSLIB:
-            # Use recommended Python native algorithm PBKDF2-HMAC-SHA256
-            # Reference: https://passlib.readthedocs.io/en/stable/narr/quickstart.html
-            enc_password = pbkdf2_sha256.hash(raw_password)
-        else:
-            # Use SHA-1 algorithm with salt
-            algorithm = "sha1"
-            raw_salt = str(random.random())
-            salt = hashlib.sha1(raw_salt).hexdigest()
-            hash_value = hashlib.sha1(salt + raw_password).hexdigest()
-            enc_password = "{}${}${}".format(algorithm, salt, hash_value)
-
-        return enc_password
+        # Use Argon2id if available, PBKDF2-HMAC-SHA256 otherwise
+        # Reference: https://passlib.readthedocs.io/en/stable/narr/quickstart.html
+        return PASSWORD_CONTEXT.hash(raw_password)
 
     # Verify a given raw password against an encrypted one
     # Return true if passwords match
     @classmethod
     def verify(cls, raw_password, enc_password):
-        if cls.USE_PASSLIB:
-            return pbkdf2_sha256.verify(raw_password, enc_password)
-        else:
-            algorithm, salt, hash_value = enc_password.split('$', 2)
-            #algorithm, hash_value = enc_password.split('$', 1)
-            if algorithm == "sha1":
-                hex_digest = hashlib.sha1(salt + raw_password).hexdigest()
-                return hash_value == hex_digest
-            else:
-                print("* ERROR: password.py: Unsupported hashing algorithm: {}".format(algorithm))
-                return False
+        return PASSWORD_CONTEXT.verify(raw_password, enc_password)
 
 def main():
     
@@ -60,8 +54,7 @@ def main():
 
     if TEST_MODE:
         raw_password = "sample_passwd"
-        Password.ENABLE_PASSLIB = False
-        print("* TEST: Settings: Use passlib library => {}".format(Password.USE_PASSLIB))
+        print("* TEST: Settings: Hashing schemes => {}".format(PASSLIB_SCHEMES))
         enc_password = Password.encode(raw_password)
         print("* TEST: Encode password '{}' =>  '{}'".format(raw_password, enc_password))
 
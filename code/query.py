@@ -5,7 +5,11 @@
 
 # External imports
 from urllib.parse import urlparse, parse_qs
-import json
+# Use orjson to decode JSON data if available, since it is much faster
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Internal imports
 from storyboard import Storyboard
@@ -18,6 +22,9 @@ from storyboard import Storyboard
 # Various constants
 SEPARATOR = "-----------------------------------------------------------------"
 
+# Maximum size of POST message content read into memory
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
 # Debugging constants
 DO_DEBUG = False
 
@@ -51,6 +58,7 @@ class Parameters:
     GET_CR_CREATION_STATUS = "get_cr_creation_status"
     GET_CR_INITIF = "get_cr_initif"
     GET_CR_CREATION_LOG = "get_cr_creation_log"
+    GET_CR_BUNDLE = "get_cr_bundle"
 
     UPLOAD_CONTENT = "upload_content"       # Content server
     REMOVE_CONTENT = "remove_content"
@@ -70,14 +78,60 @@ class Parameters:
     RANGE_ID = "range_id"
     ACTIVITY_ID = "activity_id"
 
+    # Response settings; when RAW is set to RAW_ENABLED, CyRIS files are
+    # returned as plain text instead of being wrapped in JSON
+    RAW = "raw"
+    RAW_ENABLED = "true"
+
+    # Content type of POST messages whose body is the raw description
+    # file, the other parameters being passed in the URL query string
+    YAML_CONTENT_TYPE = "application/x-yaml"
+
+    # Default values of the parameters that are not specified; lists are
+    # used in order to mimic the output of parse_qs()
+    DEFAULT_VALUES = {
+        USER: None,
+        PASSWORD: None,
+        ACTION: None,
+        LANG: [EN],
+        TYPE: None,
+        SCENARIO: None,
+        LEVEL: None,
+        COUNT: None,
+        DESCRIPTION_FILE: None,
+        PROGRESSION_SCENARIO: None,
+        RANGE_ID: None,
+        ACTIVITY_ID: None,
+        RAW: None
+    }
+
     #########################################################################
     # Initialize object with parameters from POST message
     def __init__(self, request_handler = None):
 
+        # Stream from which the description file can be read (only for
+        # POST messages with YAML content type), and its length
+        self.body_stream = None
+        self.body_length = 0
+
         if request_handler:
-            # Get the length of the POST message content, and read data
-            # from message accordingly
+            # Get the length of the POST message content
             length = int(request_handler.headers.get('content-length'))
+
+            # For YAML content, parameters are taken from the URL query
+            # string, and the body is left unread so that it can be
+            # streamed to its destination
+            if request_handler.headers.get('content-type') == self.YAML_CONTENT_TYPE:
+                self.body_stream = request_handler.rfile
+                self.body_length = length
+                self.parameters = parse_qs(urlparse(request_handler.path).query,
+                                           strict_parsing=True)
+                return
+
+            # Otherwise read data from message (only once, and only if
+            # its size is reasonable)
+            if length > MAX_BODY_SIZE:
+                raise ValueError("POST message content too large (%d bytes)" % (length))
             parameter_data = request_handler.rfile.read(length).decode('utf-8')
 
             # Parse the query string into a dictionary (raise exception if
@@ -101,25 +155,9 @@ class Parameters:
     # Get the value of the parameter corresponding to a given key
     def get(self, key):
 
-        # Set default values if the key is not specified;
-        # must use lists in order to mimic the output of parse_qs()
-        default_values = {
-            self.USER: None,
-            self.PASSWORD: None,
-            self.ACTION: None,
-            self.LANG: [self.EN],
-            self.TYPE: None,
-            self.SCENARIO: None,
-            self.LEVEL: None,
-            self.COUNT: None,
-            self.DESCRIPTION_FILE: None,
-            self.PROGRESSION_SCENARIO: None,
-            self.RANGE_ID: None,
-	    self.ACTIVITY_ID: None
-        }
-
-        # Get values associated to the key
-        values = self.parameters.get(key, default_values[key])
+        # Get values associated to the key, or the default values if the
+        # key is not specified (the defaults are not rebuilt at each call)
+        values = self.parameters.get(key, self.DEFAULT_VALUES[key])
 
         # If values is not None and not a zero length list, return the
         # first element of the list
@@ -138,7 +176,7 @@ class Response:
 
         try:
             # Load JSON data
-            data = json.loads(json_data)
+            data = json_loads(json_data)
 
             # Initialize return values to None
             status = None
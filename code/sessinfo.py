@@ -5,13 +5,44 @@
 
 # External imports
 import yaml
-import json
+# Use the libyaml-based loader if available, since it is much faster
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+# Use orjson to encode and decode JSON data if available, since it is
+# much faster (its output is compact and not limited to ASCII); the
+# json_dumps_bytes variant returns UTF-8 encoded data for writing files
+try:
+    from orjson import loads as json_loads, dumps as json_dumps_bytes
+    def json_dumps(obj):
+        return json_dumps_bytes(obj).decode('utf-8')
+except ImportError:
+    from json import loads as json_loads, dumps as json_dumps
+    def json_dumps_bytes(obj):
+        return json_dumps(obj).encode('utf-8')
+import os
+import tempfile
+import sys
 #import types
 
 # Various constants
 SEPARATOR = "-----------------------------------------------------------------"
 SEPARATO2 = "================================================================="
 
+# Buffer size used when writing session files, so that the data of many
+# sessions is written to disk with few system calls
+WRITE_BUFFER_SIZE = 64 * 1024
+
+# Buffer size used when reading YAML files; files are read in binary
+# mode so that libyaml detects the encoding and decodes the data itself
+YAML_READ_BUFFER_SIZE = 64 * 1024
+
+# Function used to make sure written data reached the disk; fdatasync()
+# skips flushing metadata that is not needed to read the data back (such
+# as the modification time), and is used where available
+sync_file_data = getattr(os, "fdatasync", os.fsync)
+
 # Debugging constants
 DO_DEBUG = False
 
@@ -36,14 +67,43 @@ class Keys:
     ACTIVITY_ID = "activity_id"
 
 
+#############################################################################
+# Intern a string field value shared by many sessions (such as a user or
+# session id), so that a single copy is kept in memory and equality
+# checks and index lookups can succeed on identity; other values are
+# returned unchanged
+#############################################################################
+def intern_field(value):
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
 #############################################################################
 # Manage session information
 #############################################################################
 class Session:
 
+    # Sessions are created in large numbers, so their fields are stored in
+    # slots rather than in a per-instance dictionary
+    __slots__ = ("name", "sess_id", "user_id", "time", "ttype", "scenarios",
+                 "levels", "language", "count", "activity_id", "representation")
+
+    # Session fields as (key, attribute name) pairs, in the order of the
+    # set_fields() arguments; used to print sessions without building a
+    # dictionary
+    FIELDS = ((Keys.NAME, "name"), (Keys.ID, "sess_id"), (Keys.USER, "user_id"),
+              (Keys.TIME, "time"), (Keys.TYPE, "ttype"), (Keys.SCENARIOS, "scenarios"),
+              (Keys.LEVELS, "levels"), (Keys.LANGUAGE, "language"), (Keys.COUNT, "count"),
+              (Keys.ACTIVITY_ID, "activity_id"))
+
     # Initialize object using scenario information
     def __init__(self, session_info=None):
 
+        # Cached representation of the session as a dictionary; sessions
+        # are not modified once created, so it is built only once
+        self.representation = None
+
         if session_info != None:
 
             # Management-related parameters
@@ -51,17 +111,17 @@ class Session:
             assert self.name!=None
 
             # Since id() is a built-in function we need to use the name "sess_id"
-            self.sess_id = session_info.get(Keys.ID, None)
+            self.sess_id = intern_field(session_info.get(Keys.ID, None))
             assert self.sess_id!=None
 
-            self.user_id = session_info.get(Keys.USER, None)
+            self.user_id = intern_field(session_info.get(Keys.USER, None))
             assert self.user_id!=None
 
             self.time = session_info.get(Keys.TIME, None)
             assert self.time!=None
 
             # Content-related parameters
-            self.ttype = session_info.get(Keys.TYPE, None)
+            self.ttype = intern_field(session_info.get(Keys.TYPE, None))
             assert self.ttype!=None
             
             self.scenarios = session_info.get(Keys.SCENARIOS, None)
@@ -70,55 +130,52 @@ class Session:
             self.levels = session_info.get(Keys.LEVELS, None)
             assert self.levels!=None
 
-            self.language = session_info.get(Keys.LANGUAGE, None)
+            self.language = intern_field(session_info.get(Keys.LANGUAGE, None))
             assert self.language!=None
 
             self.count = session_info.get(Keys.COUNT, None)
             assert self.count!=None
 
-            self.activity_id = session_info.get(Keys.ACTIVITY_ID, None)
+            self.activity_id = intern_field(session_info.get(Keys.ACTIVITY_ID, None))
 
     # Set fields for Session object
     def set_fields(self, name, sess_id, user_id, time, ttype,
                    scenarios, levels, language, count, activity_id):
         self.name = name
-        self.sess_id = sess_id
-        self.user_id = user_id
+        self.sess_id = intern_field(sess_id)
+        self.user_id = intern_field(user_id)
         self.time = time
 
-        self.ttype = ttype
+        self.ttype = intern_field(ttype)
         self.scenarios = scenarios
         self.levels = levels
-        self.language = language
+        self.language = intern_field(language)
         self.count = count
-        self.activity_id = activity_id
+        self.activity_id = intern_field(activity_id)
+        self.representation = None
         
-    # Create a string representation of the session
+    # Create a string representation of the session; the fields are
+    # read directly from the attributes, and joined once
     def __str__(self):
 
-        string = "  - " + Keys.NAME + ": " + self.name + "\n    " \
-                 + Keys.ID + ": " + str(self.sess_id) + "\n    " \
-                 + Keys.USER + ": " + self.user_id + "\n    " \
-                 + Keys.TIME + ": " + self.time  + "\n    " \
-                 + Keys.TYPE + ": " + self.ttype + "\n    " \
-                 + Keys.SCENARIOS + ": " + str(self.scenarios) + "\n    " \
-                 + Keys.LEVELS + ": " + str(self.levels) + "\n    " \
-                 + Keys.LANGUAGE + ": " + self.language + "\n    " \
-                 + Keys.COUNT + ": " + self.count + "\n    " \
-                 + Keys.ACTIVITY_ID + ": " + self.activity_id
+        string = "  - " + "\n    ".join(["{0}: {1}".format(key, getattr(self, attribute))
+                                          for key, attribute in Session.FIELDS])
 
         return string
     
     def get_JSON_representation(self, user_id):
 
         if self.user_id == user_id:
-            return self.add_info_to_representation({})
+            return self.get_JSON_representation_all()
             
         return {}
 
+    # The returned dictionary is shared, and must not be modified
     def get_JSON_representation_all(self):
 
-        return self.add_info_to_representation({})
+        if self.representation is None:
+            self.representation = self.add_info_to_representation({})
+        return self.representation
 
     def add_info_to_representation(self, session_repr):
 
@@ -143,47 +200,86 @@ class Session:
 #############################################################################
 class SessionInfo:
 
-    # List of sessions (as Session objects)
-    sessions = []
+    # Initialize object with no sessions
+    def __init__(self):
+        self.clear_sessions()
+
+    # Remove all sessions; besides the list of sessions (as Session
+    # objects), sessions are indexed by id, by (id, user id), and by user
+    # id, so that lookups don't need to scan the list; each index entry is
+    # a list of sessions in list order
+    def clear_sessions(self):
+        self.sessions = []
+        self.sessions_by_id = {}
+        self.sessions_by_id_user = {}
+        self.sessions_by_user = {}
+
+        # Cached list of session ids as integers
+        self.id_list_int = None
+
+    # Append a session to the list of sessions and to the indexes
+    def append_session(self, session):
+        self.sessions.append(session)
+        self.id_list_int = None
+        self.sessions_by_id.setdefault(session.sess_id, []).append(session)
+        self.sessions_by_id_user.setdefault((session.sess_id, session.user_id), []).append(session)
+        self.sessions_by_user.setdefault(session.user_id, []).append(session)
+
+    # Remove a session from the list of sessions and from the indexes
+    def discard_session(self, session):
+        self.sessions.remove(session)
+        self.id_list_int = None
+        for index, key in ((self.sessions_by_id, session.sess_id),
+                           (self.sessions_by_id_user, (session.sess_id, session.user_id)),
+                           (self.sessions_by_user, session.user_id)):
+            index_sessions = index[key]
+            index_sessions.remove(session)
+            if not index_sessions:
+                del index[key]
 
     # Parse YAML information in a file and store values into the
     # object fields
     def parse_YAML_file(self, yaml_file_name):
 
         # Initialize the sessions list
-        self.sessions = []
+        self.clear_sessions()
         
         # Open the YAML file
         try:
-            yaml_file = open(yaml_file_name, "r")
+            yaml_file = open(yaml_file_name, "rb", buffering=YAML_READ_BUFFER_SIZE)
         except IOError:
             print ("* WARNING: sessinfo: Cannot open file '%s' for read." % (yaml_file_name))
             return False
         
         try:
-            # Load the YAML information
-            info = yaml.load(yaml_file, Loader=yaml.SafeLoader)
-
-            # Close the file
-            yaml_file.close()
+            # Load the YAML information, and close the file even in case
+            # of error
+            with yaml_file:
+                info = yaml.load(yaml_file, Loader=SafeLoader)
 
             # Actually parse the information
             return self.parse_info(info)
 
-        except yaml.YAMLError as exc:
-            if hasattr(exc, 'problem_mark'):
-                mark = exc.problem_mark
+        except yaml.MarkedYAMLError as exc:
+            mark = exc.problem_mark
+            if mark is not None:
                 print ("* ERROR: sessinfo: YAML error in file %s at position: (%s:%s)." % (
                     yaml_file_name, mark.line+1, mark.column+1))
+            else:
+                print ("* ERROR: sessinfo: YAML error in file %s: %s." % (yaml_file_name, exc))
 
             return False
+
+        except yaml.YAMLError as exc:
+            print ("* ERROR: sessinfo: YAML error in file %s: %s." % (yaml_file_name, exc))
+            return False
         
     # Parse JSON data and store values into the object fields
     def parse_JSON_data(self, json_data):
 
         try:
             # Load JSON data from json_data
-            data = json.loads(json_data)
+            data = json_loads(json_data)
 
             # Actually parse the information
             return self.parse_info(data)
@@ -198,7 +294,7 @@ class SessionInfo:
     def parse_info(self, info):
 
         # Initialize the sessions list
-        self.sessions = []
+        self.clear_sessions()
         
         # Get data for all training sessions from info
         for data in info:
@@ -222,7 +318,7 @@ class SessionInfo:
         for session_info in sessions_info:
 
             session = Session(session_info)
-            self.sessions.append(session)
+            self.append_session(session)
 
             if DO_DEBUG:
                 print ("* DEBUG: sessinfo: SESSION:\n%s" % (session))
@@ -232,7 +328,6 @@ class SessionInfo:
 
         return True
 
-    
     # Add a session with the corresponding parameters
     def add_session(self, session_name, cyber_range_id, user_id, crt_time,
                     ttype, scenarios, levels, language, count, activity_id):
@@ -240,7 +335,7 @@ class SessionInfo:
         session = Session(None)
         session.set_fields(session_name, cyber_range_id, user_id, crt_time,
                            ttype, scenarios, levels, language, count, activity_id)
-        self.sessions.append(session)
+        self.append_session(session)
 
         #if DO_DEBUG:   
         #self.pretty_print()
@@ -249,17 +344,17 @@ class SessionInfo:
     # Remove a session with the corresponding parameters
     def remove_session(self, cyber_range_id, user_id):
 
-        for session in self.sessions:
-            if session.sess_id == cyber_range_id and session.user_id == user_id:
-                self.sessions.remove(session)
-                return True
+        sessions = self.sessions_by_id_user.get((cyber_range_id, user_id))
+        if sessions:
+            self.discard_session(sessions[0])
+            return True
 
         return False
     # Remove a session with the corresponding parameters
     def remove_session_variation(self, cyber_range_id, user_id,activity_id):
-        for session in self.sessions:
-            if session.sess_id == cyber_range_id and session.user_id == user_id and session.activity_id == activity_id:
-                self.sessions.remove(session)
+        for session in self.sessions_by_id_user.get((cyber_range_id, user_id), ()):
+            if session.activity_id == activity_id:
+                self.discard_session(session)
                 return True
 
         return False
@@ -267,94 +362,120 @@ class SessionInfo:
     # Build a list of active session ids
     def get_id_list_int(self):
 
-        id_list = []
-        for session in self.sessions:
-            id_list.append(int(session.sess_id))
+        # The list is converted once, and kept until sessions change
+        if self.id_list_int is None:
+            self.id_list_int = [int(session.sess_id) for session in self.sessions]
 
-        return id_list
+        return list(self.id_list_int)
 
     # Determine whether a session with the given id exists
     def is_session_id(self, cyber_range_id):
 
-        for session in self.sessions:
-            if session.sess_id == cyber_range_id:
-                return True
-
-        return False
+        return cyber_range_id in self.sessions_by_id
 
     # Determine whether a session with the given id exists for the
     # specified user
     def is_session_id_user(self, cyber_range_id, user_id):
 
-        for session in self.sessions:
-            if session.sess_id == cyber_range_id and session.user_id == user_id:
-                return True
-
-        return False
+        return (cyber_range_id, user_id) in self.sessions_by_id_user
 
     # Get the activity id for a session with given id and a specified user
     def get_activity_id(self, cyber_range_id, user_id):
 
-        for session in self.sessions:
-            if session.sess_id == cyber_range_id and session.user_id == user_id:
-                return session.activity_id
+        sessions = self.sessions_by_id_user.get((cyber_range_id, user_id))
+        if sessions:
+            return sessions[0].activity_id
 
         return None
 
-    # Get the activity id for a session with given id and a specified user
+    # Get the list of activity ids for all the sessions with given id and
+    # a specified user; only the (small) bucket of matching sessions in
+    # the index is traversed
     def get_activity_id_list(self, cyber_range_id, user_id):
-        activity_list=[]
-        for session in self.sessions:
-            if session.sess_id == cyber_range_id and session.user_id == user_id:
-                activity_list.append(session.activity_id)
-        if activity_list is None:
-            return None
-        else:
-            return activity_list
-
-    # Store session information in a YAML file
-    def write_YAML_file(self, yaml_file_name):
 
-        print ("* INFO: sessinfo: Writing session info to file '%s'..." % (yaml_file_name))
+        sessions = self.sessions_by_id_user.get((cyber_range_id, user_id), ())
+        return [session.activity_id for session in sessions]
 
-        info = self.get_JSON_representation_all()
+    # Store session information in a YAML file; the information is
+    # first written to a temporary file in the same directory, which
+    # then replaces the file, so that readers never see a partial file
+    # Return True on success, False otherwise
+    def write_YAML_file(self, yaml_file_name):
 
-        # Open the YAML file
-        try:
-            yaml_file = open(yaml_file_name, "w")
-        except IOError:
-            print ("* ERROR: sessinfo: Cannot open file '%s' for write." % (yaml_file_name))
-            return False
+        print ("* INFO: sessinfo: Writing session info to file '%s'..." % (yaml_file_name))
 
         if DO_DEBUG:
             print (SEPARATOR)
             print ("* DEBUG: sessinfo: Current session info:")
-            print (info)
+            print (self.get_JSON_representation_all())
 #            print yaml.dump(info)
 #            print yaml.dump(info, default_flow_style = None)
 #            print yaml.dump(info, default_flow_style = False)
 #            print yaml.dump(info, default_flow_style = True)
             print (SEPARATOR)
 
-        yaml_file.write(info)
-        
         #yaml.dump(info, yaml_file)
-        
-        # Close the file
-        yaml_file.close()
-       
+
+        # Open a temporary file
+        yaml_dir_name, yaml_base_name = os.path.split(os.path.abspath(yaml_file_name))
+        try:
+            fd, temp_file_name = tempfile.mkstemp(prefix=yaml_base_name + ".", dir=yaml_dir_name)
+        except OSError:
+            print ("* ERROR: sessinfo: Cannot open file '%s' for write." % (yaml_file_name))
+            return False
+
+        try:
+            # Keep the permissions of the existing file, if any
+            try:
+                os.fchmod(fd, os.stat(yaml_file_name).st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+
+            # Write the information as bytes through a large buffer, and
+            # make sure it reached the disk before the file is replaced
+            with os.fdopen(fd, "wb", buffering=WRITE_BUFFER_SIZE) as yaml_file:
+                self.write_JSON_representation_all(yaml_file)
+                yaml_file.flush()
+                sync_file_data(yaml_file.fileno())
+            os.replace(temp_file_name, yaml_file_name)
+
+        except OSError as error:
+            print ("* ERROR: sessinfo: Cannot write file '%s': %s." % (yaml_file_name, error))
+            try:
+                os.unlink(temp_file_name)
+            except OSError:
+                pass
+            return False
+
+        return True
+
+    # Write the representation built by get_JSON_representation_all() to
+    # the binary file output_file, one session at a time, so that the
+    # complete representation is never held in memory
+    def write_JSON_representation_all(self, output_file):
+
+        output_file.write(b'[{"' + Keys.SESSIONS.encode('utf-8') + b'":[')
+        separator = b""
+        for session in self.sessions:
+            output_file.write(separator)
+            output_file.write(json_dumps_bytes(session.get_JSON_representation_all()))
+            separator = b","
+        output_file.write(b"]}]")
+
     # Pretty-print info about the scenarios
+    # (the output is built first, then written at once)
     def pretty_print(self):
-        print (SEPARATOR)
-        print ("SESSION INFO: %d session(s)" % (len(self.sessions)))
-        print (SEPARATOR)
+        lines = [SEPARATOR]
+        lines.append("SESSION INFO: %d session(s)" % (len(self.sessions)))
+        lines.append(SEPARATOR)
         index = 1;
         for session in self.sessions:
-            #print ("SESSION %d:" % (index)
-            print ("SESSION:")
-            print (session.__str__())
+            #lines.append("SESSION %d:" % (index))
+            lines.append("SESSION:")
+            lines.append(session.__str__())
             index += 1
-        print (SEPARATOR)
+        lines.append(SEPARATOR)
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
     # Create an external JSON representation that includes only
@@ -362,21 +483,17 @@ class SessionInfo:
     def get_JSON_representation(self, user_id):
         representation = []
 
-        # Build sessions representation
+        # Build sessions representation; only the sessions of the user
+        # are considered
         sessions_repr = {}
-        sessions_repr_array = []
-        for session in self.sessions:
-            session_repr = session.get_JSON_representation(user_id)
-
-            # Only add representation to array if it is not empty
-            if session_repr:
-                sessions_repr_array.append(session_repr)
+        sessions_repr_array = [session.get_JSON_representation_all()
+                               for session in self.sessions_by_user.get(user_id, ())]
         sessions_repr[Keys.SESSIONS] = sessions_repr_array
 
         # Combine representations
         representation.append(sessions_repr)
 
-        return json.dumps(representation)
+        return json_dumps(representation)
 
     # Create an external JSON representation that includes
     # information for all users
@@ -397,7 +514,7 @@ class SessionInfo:
         # Combine representations
         representation.append(sessions_repr)
 
-        return json.dumps(representation)
+        return json_dumps(representation)
 
 
 #############################################################################
@@ -3,6 +3,10 @@
 # Classes related to the CyTrONE storyboard
 #############################################################################
 
+# External imports
+import os
+
+
 class Storyboard:
 
     # Global configuration flags
@@ -12,6 +16,9 @@ class Storyboard:
     SSL_certfile = "cytrone.crt"
     SSL_ca_certs = None
 
+    # Maximum number of worker threads used by each server
+    SERVER_MAX_WORKERS = 2 * (os.cpu_count() or 1)
+
     # Separator constants
     SEPARATOR1 = "-------------------------------------------------------------------------"
     SEPARATOR2 = "========================================================================="
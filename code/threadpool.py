@@ -0,0 +1,99 @@
+
+#############################################################################
+# Classes related to the thread pool used by CyTrONE servers
+#############################################################################
+
+# External imports
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import os
+import signal
+import sys
+import threading
+from socketserver import ThreadingMixIn
+
+# Internal imports
+from storyboard import Storyboard
+
+
+#############################################################################
+# Mix-in class that handles each request in a thread taken from a bounded
+# pool, instead of creating a new thread for every request
+#############################################################################
+class ThreadPoolMixIn(ThreadingMixIn):
+
+    # Maximum number of requests handled concurrently; further requests
+    # wait in the pool queue until a worker thread becomes available
+    max_workers = Storyboard.SERVER_MAX_WORKERS
+
+    # Maximum number of additional worker threads, used while other
+    # workers only wait for long-running operations to complete
+    max_long_running = Storyboard.SERVER_MAX_WORKERS
+
+    _pool = None
+    _slots = None
+
+    # Submit the request to the thread pool; the pool has threads for the
+    # long-running operations too, but only max_workers of its threads can
+    # hold a slot, that is actually handle a request, at the same time
+    def process_request(self, request, client_address):
+        if self._pool is None:
+            self._slots = threading.Semaphore(self.max_workers)
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers + self.max_long_running,
+                                            thread_name_prefix=self.__class__.__name__)
+        self._pool.submit(self.process_request_slot, request, client_address)
+
+    # Handle the request once a slot is available
+    def process_request_slot(self, request, client_address):
+        with self._slots:
+            self.process_request_thread(request, client_address)
+
+    # Context manager used by request handlers around long-running
+    # operations that don't use the server (such as external commands);
+    # the slot is released meanwhile, so that other requests are handled
+    @contextlib.contextmanager
+    def long_running(self):
+        self._slots.release()
+        try:
+            yield
+        finally:
+            self._slots.acquire()
+
+    # Close the server and stop the worker threads
+    def server_close(self):
+        super().server_close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=self.block_on_close)
+
+
+#############################################################################
+# Serve requests from process_count pre-forked processes that share the
+# listening socket of the server; each process handles requests with its
+# own thread pool, since the pool is only created after the fork
+#############################################################################
+def serve_forever_forked(server, process_count):
+
+    children = []
+    for _ in range(process_count - 1):
+        pid = os.fork()
+        if pid == 0:
+            # Child process: serve until interrupted, then exit without
+            # returning to the caller
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    # The parent process also serves requests, and stops the children
+    # when it ends, including when it is terminated by a signal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
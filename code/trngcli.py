@@ -28,12 +28,30 @@ SEPARATOR = "----------------------------------------------------------------"
 HTTP_PREFIX="http://"
 HTTPS_PREFIX="https://"
 
+# Actions whose responses are displayed in the same way, checked by
+# set membership
+CREATE_TRAINING_ACTIONS = frozenset([query.Parameters.CREATE_TRAINING,
+                                     query.Parameters.CREATE_TRAINING_Variation])
+END_TRAINING_ACTIONS = frozenset([query.Parameters.END_TRAINING,
+                                  query.Parameters.END_TRAINING_Variation])
+
 # Debugging constants
 DATABASE_DIR = "../database/"
 INSTANTIATE_RANGE_FROM_FILE = False
 SAMPLE_INSTANTIATE_RANGE = DATABASE_DIR + "NIST-level1-range.yml"
 
-    
+
+#############################################################################
+# Prepare a message text received from a server for display; the text is
+# only URL-decoded if it contains escapes, and trailing end of line etc.
+# are removed
+#############################################################################
+def get_display_text(text):
+    if "%" in text:
+        text = urllib.parse.unquote(text)
+    return text.rstrip()
+
+
 #############################################################################
 # Main program
 #############################################################################
@@ -66,25 +84,28 @@ try:
     params.parse_parameters(POST_parameters)
     action = params.get(query.Parameters.ACTION)
 
-    # Additional parameter needed for instantiate range action
+    # Additional parameter needed for instantiate range action; the
+    # description is quoted directly from the file bytes, and all the
+    # parameters are joined once
+    POST_parameters_list = [POST_parameters]
     if action == query.Parameters.INSTANTIATE_RANGE and INSTANTIATE_RANGE_FROM_FILE:
         try:
-            instantiate_file = open(SAMPLE_INSTANTIATE_RANGE, "r")
+            instantiate_file = open(SAMPLE_INSTANTIATE_RANGE, "rb")
             instantiate_content = instantiate_file.read()
             instantiate_file.close()
             logging.info("Use cyber range description from file {0}.".format(SAMPLE_INSTANTIATE_RANGE))
             
-            description_parameters = {query.Parameters.DESCRIPTION_FILE: instantiate_content}
-            description_parameters = urllib.parse.urlencode(description_parameters)
-            POST_parameters += ("&" + description_parameters)
+            POST_parameters_list.append(query.Parameters.DESCRIPTION_FILE + "="
+                                        + urllib.parse.quote_plus(instantiate_content))
         except IOError:
             logging.error("Cannot read from file {0}.".format(SAMPLE_INSTANTIATE_RANGE))
+    POST_parameters = "&".join(POST_parameters_list)
 
     # Connect to server with the given POST parameters
     if Storyboard.ENABLE_PASSWORD:
         logging.info("Client POST parameters: [not shown because password use is enabled]")
     else:
-        logging.info("Client POST parameters: "+ POST_parameters)
+        logging.info("Client POST parameters: %s", POST_parameters)
     if POST_parameters:
         if Storyboard.ENABLE_HTTPS:
             logging.info("HTTPS is enabled => set up SSL connection (currently w/o checking!)")
@@ -102,8 +123,11 @@ try:
 
     data = data_stream.read()
 
-    # Show server response
-    logging.debug("Server response: " + data.decode('utf-8'))
+    # Show server response; the response is kept as bytes, and is only
+    # decoded here if debugging messages are actually displayed, while
+    # the message itself is formatted lazily by the logging module
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Server response: %s", data.decode('utf-8', errors='replace'))
 
     (status, message) = query.Response.parse_server_response(data)
 
@@ -124,26 +148,14 @@ try:
             print (message)
             print (SEPARATOR)
             
-    elif action == query.Parameters.CREATE_TRAINING:
+    elif action in CREATE_TRAINING_ACTIONS:
         logging.info("Training server action '{0}' done => {1}.".format(action, status))
 
         # Display message if any (including in case of error)
         if message:
             logging.info("Showing training session creation information... ")
             print (SEPARATOR)
-            # We use rstrip() to remove trailing end of line etc.
-            print (urllib.parse.unquote(message).rstrip())
-            print (SEPARATOR)
-
-    elif action == query.Parameters.CREATE_TRAINING_Variation:
-        logging.info("Training server action '{0}' done => {1}.".format(action, status))
-
-        # Display message if any (including in case of error)
-        if message:
-            logging.info("Showing training session creation information... ")
-            print (SEPARATOR)
-            # We use rstrip() to remove trailing end of line etc.
-            print (urllib.parse.unquote(message).rstrip())
+            print (get_display_text(message))
             print (SEPARATOR)
 
     elif action == query.Parameters.GET_CONFIGURATIONS:
@@ -176,16 +188,7 @@ try:
             print (message)
             print (SEPARATOR)
 
-    elif action == query.Parameters.END_TRAINING:
-        logging.info("Training server action '{0}' done => {1}.".format(action, status))
-
-        # Display message if any (including in case of error)
-        if message:
-            logging.info("Showing training session termination information... ")
-            print (SEPARATOR)
-            print (message)
-            print (SEPARATOR)
-    elif action == query.Parameters.END_TRAINING_Variation:
+    elif action in END_TRAINING_ACTIONS:
         logging.info("Training server action '{0}' done => {1}.".format(action, status))
 
         # Display message if any (including in case of error)
@@ -255,6 +258,23 @@ try:
             print (message)
             print (SEPARATOR)
 
+    elif action == query.Parameters.GET_CR_BUNDLE:
+        logging.info("Instantiation server action '{0}' done => {1}.".format(action, status))
+
+        # Display the content of each file in the bundle
+        if isinstance(message, dict):
+            logging.info("Showing cyber range bundle information... ")
+            for file_action, file_content in message.items():
+                print (SEPARATOR)
+                print ("{0}:".format(file_action))
+                if file_content is not None:
+                    print (get_display_text(file_content))
+            print (SEPARATOR)
+        elif message:
+            print (SEPARATOR)
+            print (message)
+            print (SEPARATOR)
+
     # Handle instantiation server actions
     elif action == query.Parameters.INSTANTIATE_RANGE:        
         logging.info("Instantiation server action '{0}' done => {1}.".format(action, status))
@@ -5,13 +5,30 @@
 
 # External imports
 import yaml
-import json
+# Use the libyaml-based loader if available, since it is much faster
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+# Use orjson to encode and decode JSON data if available, since it is
+# much faster (its output is compact and not limited to ASCII)
+try:
+    from orjson import loads as json_loads, dumps as orjson_dumps
+    def json_dumps(obj):
+        return orjson_dumps(obj).decode('utf-8')
+except ImportError:
+    from json import loads as json_loads, dumps as json_dumps
+import sys
 import types
 
 # Various constants
 SEPARATOR = "-----------------------------------------------------------------"
 SEPARATO2 = "================================================================="
 
+# Buffer size used when reading YAML files; files are read in binary
+# mode so that libyaml detects the encoding and decodes the data itself
+YAML_READ_BUFFER_SIZE = 64 * 1024
+
 # Debugging constants
 DO_DEBUG = False
 
@@ -38,6 +55,9 @@ class Keys:
 #############################################################################
 class TrainingType:
 
+    # Fields are stored in slots rather than in a per-instance dictionary
+    __slots__ = ("name", "category")
+
     # Initialize object based on type information
     def __init__(self, type_info):
 
@@ -69,8 +89,13 @@ class TrainingType:
 #############################################################################
 class Scenario:
 
-    # Initialize object using scenario information
-    def __init__(self, scenario_info):
+    # Fields are stored in slots rather than in a per-instance dictionary
+    __slots__ = ("name", "levels")
+
+    # Initialize object using scenario information; if levels_by_name
+    # is provided, the levels are also indexed into it by (scenario name,
+    # level name) while being created, so that no second pass is needed
+    def __init__(self, scenario_info, levels_by_name=None):
 
         self.name = scenario_info.get(Keys.NAME, None)
         assert self.name!=None
@@ -82,6 +107,8 @@ class Scenario:
         for level_info in levels_info:
             level = Level(level_info)
             self.levels.append(level)
+            if levels_by_name != None:
+                levels_by_name[(self.name, level.name)] = level
 
     # Create a string representation of the scenario
     def __str__(self):
@@ -112,6 +139,9 @@ class Scenario:
 #############################################################################
 class Level:
 
+    # Fields are stored in slots rather than in a per-instance dictionary
+    __slots__ = ("name", "content_file", "range_file", "progression_scenario")
+
     # Initialize object based on level information
     def __init__(self, level_info):
 
@@ -151,42 +181,50 @@ class TrainingInfo:
     # List of scenarios (as Scenario objects)
     scenarios = []
 
+    # Levels indexed by (scenario name, level name)
+    levels_by_name = {}
+
     # Parse a YAML information in a file and store values into the
     # object fields
     def parse_YAML_file(self, yaml_file_name):
 
         # Open the YAML file
         try:
-            yaml_file = open(yaml_file_name, "r")
+            yaml_file = open(yaml_file_name, "rb", buffering=YAML_READ_BUFFER_SIZE)
         except IOError:
             print ("ERROR: Cannot open file %s." % (yaml_file_name))
             return False
 
         try:
-            # Load the YAML information
-            info = yaml.load(yaml_file, Loader=yaml.SafeLoader)
-
-            # Close the file
-            yaml_file.close()
+            # Load the YAML information, and close the file even in case
+            # of error
+            with yaml_file:
+                info = yaml.load(yaml_file, Loader=SafeLoader)
 
             # Actually parse the information
             return self.parse_info(info)
 
-        except yaml.YAMLError as exc:
-            if hasattr(exc, 'problem_mark'):
-                mark = exc.problem_mark
+        except yaml.MarkedYAMLError as exc:
+            mark = exc.problem_mark
+            if mark is not None:
                 print ("ERROR: YAML error in file %s at position: (%s:%s)." % (
                     yaml_file_name, mark.line+1, mark.column+1))
+            else:
+                print ("ERROR: YAML error in file %s: %s." % (yaml_file_name, exc))
 
             return False
 
+        except yaml.YAMLError as exc:
+            print ("ERROR: YAML error in file %s: %s." % (yaml_file_name, exc))
+            return False
+
 
     # Parse JSON data and store values into the object fields
     def parse_JSON_data(self, json_data):
 
         try:
             # Load JSON data from json_data
-            data = json.loads(json_data)
+            data = json_loads(json_data)
 
             # Actually parse the information
             return self.parse_info(data)
@@ -203,15 +241,23 @@ class TrainingInfo:
         # Initialize the types list
         self.types = []
 
-        # Initialize the scenario list
+        # Initialize the scenario list and the level index
         self.scenarios = []
+        self.levels_by_name = {}
 
-        # Get data for all training types from info
+        # Get data for all training types and all scenarios from info,
+        # in a single pass
+        types_info = None
+        scenarios_info = None
         for data in info:
-            types_info = data.get(Keys.TYPES, None)
-            if types_info != None:
-                break    
+            if types_info == None:
+                types_info = data.get(Keys.TYPES, None)
+            if scenarios_info == None:
+                scenarios_info = data.get(Keys.SCENARIOS, None)
+            if types_info != None and scenarios_info != None:
+                break
         assert types_info!=None
+        assert scenarios_info!=None
 
         if DO_DEBUG:
             print (SEPARATOR)
@@ -232,13 +278,6 @@ class TrainingInfo:
         if DO_DEBUG:
             print (SEPARATOR)
 
-        # Get data for all scenarios from info
-        for data in info:
-            scenarios_info = data.get(Keys.SCENARIOS, None)
-            if scenarios_info != None:
-                break
-        assert scenarios_info!=None
-
         if DO_DEBUG:
             print (SEPARATOR)
             print ("PARSE INFO: %d scenario(s)" % (
@@ -249,7 +288,7 @@ class TrainingInfo:
         # Get data for each scenario
         for scenario_info in scenarios_info:
 
-            scenario = Scenario(scenario_info)
+            scenario = Scenario(scenario_info, self.levels_by_name)
             self.scenarios.append(scenario)
 
             if DO_DEBUG:
@@ -262,22 +301,24 @@ class TrainingInfo:
 
 
     # Pretty-print info about the scenarios
+    # (the output is built first, then written at once)
     def pretty_print(self):
-        print (SEPARATOR)
-        print ("TRAINING INFO: %d type(s)  %d scenario(s)" % (
+        lines = [SEPARATOR]
+        lines.append("TRAINING INFO: %d type(s)  %d scenario(s)" % (
             len(self.types), len(self.scenarios)))
-        print (SEPARATOR)
+        lines.append(SEPARATOR)
         index = 1;
         for type in self.types:
-            print ("TYPE #%d:" % (index))
-            print (type.__str__())
+            lines.append("TYPE #%d:" % (index))
+            lines.append(type.__str__())
             index += 1
         index = 1;
         for scenario in self.scenarios:
-            print ("SCENARIO #%d:" % (index))
-            print (scenario.__str__())
+            lines.append("SCENARIO #%d:" % (index))
+            lines.append(scenario.__str__())
             index += 1
-        print (SEPARATOR)
+        lines.append(SEPARATOR)
+        sys.stdout.write("\n".join(lines) + "\n")
 
 
     # Create an external JSON representation that includes only
@@ -303,56 +344,38 @@ class TrainingInfo:
         representation.append(types_repr)
         representation.append(scenarios_repr)
 
-        return json.dumps(representation)
+        return json_dumps(representation)
 
 
     # Get the name of the file that contains the training content for the
     # scenario and level provided as arguments
     def get_content_file_name(self, scenario_name, level_name):
 
-        content_file = None
-        #print ("DEBUG: Search for scenario=%s level=%s... (type=%s)" % (scenario_name.__str__(), level_name, type(scenario_name))
+        level = self.levels_by_name.get((scenario_name, level_name))
+        if level:
+            return level.content_file
 
-        for scenario in self.scenarios:
-
-            if scenario.name == scenario_name:
-                for level in scenario.levels:
-                    if level.name == level_name:
-                        content_file = level.content_file
-
-        return content_file
+        return None
 
     # Get the name of the file that contains the range specification for the
     # scenario and level provided as arguments
     def get_range_file_name(self, scenario_name, level_name):
 
-        range_file = None
-        #print ("DEBUG: Search for scenario=%s level=%s... (type=%s)" % (scenario_name.__str__(), level_name, type(scenario_name))
+        level = self.levels_by_name.get((scenario_name, level_name))
+        if level:
+            return level.range_file
 
-        for scenario in self.scenarios:
-
-            if scenario.name == scenario_name:
-                for level in scenario.levels:
-                    if level.name == level_name:
-                        range_file = level.range_file
-
-        return range_file
+        return None
 
     # Get the name of the file that contains the progression details
     # for the scenario and level provided as arguments
     def get_progression_scenario_name(self, scenario_name, level_name):
 
+        level = self.levels_by_name.get((scenario_name, level_name))
+        if level:
+            return level.progression_scenario
 
-        progression_scenario = None
-
-        for scenario in self.scenarios:
-
-            if scenario.name == scenario_name:
-                for level in scenario.levels:
-                    if level.name == level_name:
-                        progression_scenario = level.progression_scenario
-
-        return progression_scenario
+        return None
 
 
 #############################################################################
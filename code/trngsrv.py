@@ -4,26 +4,37 @@ import os
 import sys
 import getopt
 import requests
-import json
+from requests.adapters import HTTPAdapter
+# Use orjson to encode and decode JSON data if available, since it is
+# much faster; json_dumps_bytes returns UTF-8 encoded data
+try:
+    from orjson import loads as json_loads, dumps as json_dumps_bytes
+except ImportError:
+    from json import loads as json_loads, dumps as json_dumps
+    def json_dumps_bytes(obj):
+        return json_dumps(obj).encode('utf-8')
+import functools
+from urllib.parse import quote_plus
+import http.client
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from socketserver import ThreadingMixIn
+from threadpool import ThreadPoolMixIn
+import logsetup
 import query
 from storyboard import Storyboard
 from password import Password
 import sessinfo
 import trnginfo
 import userinfo
+import cached_yaml
+
+# --- Paths (resolved once at import time) ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_DIR = os.path.join(BASE_DIR, 'database')
+TRAINING_FILE = os.path.join(DATABASE_DIR, 'training-en.yml')
 
 # --- Modernized Logging Setup ---
-LOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cytrone_debug.log')
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+LOG_FILE = os.path.join(BASE_DIR, 'cytrone_debug.log')
+logsetup.setup_logging(LOG_FILE)
 logger = logging.getLogger(__name__)
 
 # --- Constants (Restored) ---
@@ -31,11 +42,64 @@ LOCAL_ADDRESS = "0.0.0.0"
 SERVER_PORT = 8082
 CONTENT_SERVER_URL = "http://127.0.0.1:8084"
 INSTANTIATION_SERVER_URL = "http://127.0.0.1:8083"
+
+# Shared HTTP session, so that connections to the other servers are kept
+# alive and reused across requests (the session can be used by several
+# threads at the same time)
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=64))
+HTTP_TIMEOUT = 30
+RESPONSE_BUFFER_SIZE = 64 * 1024  # Size of the buffer in which responses are assembled
+DATABASE_FILE_CACHE_SIZE = 128  # Number of database files kept in memory
+ERROR_RESPONSE_CACHE_SIZE = 64  # Number of encoded error responses kept in memory
+
+# Last item of successful responses, and cached response to the fetch
+# content action, as a tuple (training information object, encoded body)
+RESPONSE_STATUS_SUCCESS_ITEM = {Storyboard.SERVER_STATUS_KEY: Storyboard.SERVER_STATUS_SUCCESS}
+FETCH_CONTENT_RESPONSE = None
+
+# Query string of the content upload requests; the parameter names and the
+# constant values are URL-safe, so only the user id needs to be quoted
+UPLOAD_CONTENT_QUERY_TEMPLATE = (f"{query.Parameters.USER}={{user}}"
+                                 f"&{query.Parameters.ACTION}={query.Parameters.UPLOAD_CONTENT}"
+                                 f"&{query.Parameters.RANGE_ID}=1") # Simplified for now
 # ... (other constants)
 
+# POST content as raw request body through the shared session; the other
+# parameters are passed in the URL query string, either as a dictionary
+# or as an already encoded string
+# Return the response status code and body
+def post_content(server_url, params, content, content_type, timeout=HTTP_TIMEOUT):
+    response = HTTP_SESSION.post(server_url, params=params, data=content,
+                                 headers={"Content-Type": content_type}, timeout=timeout)
+    return response.status_code, response.content
+
+# Read a database file (such as a content or range description), reusing
+# the content read previously as long as the file modification time and
+# size are unchanged, so that usually only os.stat() is called
+# Return the file content as bytes (raise OSError in case of error)
+def read_database_file(file_name):
+    stat_result = os.stat(file_name)
+    return read_file_content(file_name, stat_result.st_mtime_ns, stat_result.st_size)
+
+@functools.lru_cache(maxsize=DATABASE_FILE_CACHE_SIZE)
+def read_file_content(file_name, mtime_ns, size):
+    with open(file_name, "rb") as database_file:
+        return database_file.read()
+
+# Encode the response to a failed request; most error messages come from
+# a small set, so their encoded responses are reused
+@functools.lru_cache(maxsize=ERROR_RESPONSE_CACHE_SIZE)
+def get_error_response(message):
+    return json_dumps_bytes([{'status': 'ERROR', 'message': message}])
+
 class RequestHandler(BaseHTTPRequestHandler):
+    # Buffer the output, so that the response headers and body are sent
+    # together when the response is flushed after each request
+    wbufsize = RESPONSE_BUFFER_SIZE
+
     def log_message(self, format, *args):
-        logger.info(f"{self.client_address[0]} - {format % args}")
+        logger.info("%s - " + format, self.client_address[0], *args)
 
     def do_POST(self):
         try:
@@ -45,8 +109,9 @@ class RequestHandler(BaseHTTPRequestHandler):
             # ... (user and password verification remains the same)
 
             action = params.get(query.Parameters.ACTION)
-            if action == query.Parameters.CREATE_TRAINING:
-                self.handle_create_training(params)
+            handler = self.ACTION_HANDLERS.get(action)
+            if handler:
+                handler(self, params)
             else:
                 self.respond_error(f"Unsupported action: {action}")
 
@@ -54,6 +119,29 @@ class RequestHandler(BaseHTTPRequestHandler):
             logger.exception("Critical error in do_POST")
             self.respond_error("Internal Server Error")
 
+    def handle_fetch_content(self, params):
+        global FETCH_CONTENT_RESPONSE
+
+        training_info = cached_yaml.load_cached(TRAINING_FILE, trnginfo.TrainingInfo)
+        if not training_info:
+            self.respond_error(Storyboard.TRAINING_SETTINGS_LOADING_ERROR)
+            return
+
+        # The response only depends on the training information, which is
+        # parsed again only when the file changes, so it is built once per
+        # parsed object; the status is appended as the last item of the
+        # representation, where clients take it from
+        cached_response = FETCH_CONTENT_RESPONSE
+        if cached_response and cached_response[0] is training_info:
+            response_body = cached_response[1]
+        else:
+            training_repr = json_loads(training_info.get_JSON_representation())
+            training_repr.append(RESPONSE_STATUS_SUCCESS_ITEM)
+            response_body = json_dumps_bytes(training_repr)
+            FETCH_CONTENT_RESPONSE = (training_info, response_body)
+
+        self.respond_success(response_body)
+
     def handle_create_training(self, params):
         # ... (parameter extraction and validation)
         user_id = params.get(query.Parameters.USER)
@@ -61,70 +149,93 @@ class RequestHandler(BaseHTTPRequestHandler):
         level_name = params.get(query.Parameters.LEVEL)
         
         # Simplified for clarity
-        training_info = trnginfo.TrainingInfo()
-        training_info.parse_YAML_file(os.path.join(os.path.dirname(__file__), '../database/training-en.yml'))
+        training_info = cached_yaml.load_cached(TRAINING_FILE, trnginfo.TrainingInfo)
+        if not training_info:
+            self.respond_error(Storyboard.TRAINING_SETTINGS_LOADING_ERROR)
+            return
         content_file_name = training_info.get_content_file_name(scenario_name, level_name)
         
         if not content_file_name:
             self.respond_error("Content file not found for scenario.")
             return
 
-        with open(os.path.join(os.path.dirname(__file__), '../database/', content_file_name), "r") as f:
-            content_file_content = f.read()
-
         # --- Call Content Server ---
-        post_data_to_contsrv = {
-            query.Parameters.USER: user_id,
-            query.Parameters.ACTION: query.Parameters.UPLOAD_CONTENT,
-            query.Parameters.DESCRIPTION_FILE: content_file_content,
-            query.Parameters.RANGE_ID: "1" # Simplified for now
-        }
-        logger.info(f"Sending request to content server at {CONTENT_SERVER_URL}")
-        logger.debug(f"Request body to contsrv: {post_data_to_contsrv}")
+        # The content file is streamed as the request body, and the other
+        # parameters are passed in the URL query string
+        params_to_contsrv = UPLOAD_CONTENT_QUERY_TEMPLATE.format(user=quote_plus(user_id or ""))
+        logger.info("Sending request to content server at %s", CONTENT_SERVER_URL)
+        logger.debug("Request parameters to contsrv: %r", params_to_contsrv)
 
         try:
-            response = requests.post(CONTENT_SERVER_URL, data=post_data_to_contsrv, timeout=30)
-            response.raise_for_status()
-            logger.info(f"Received {response.status_code} from content server.")
-            logger.debug(f"Response body from contsrv: {response.text}")
-            
-            contsrv_data = response.json()
+            content = read_database_file(os.path.join(DATABASE_DIR, content_file_name))
+        except IOError:
+            logger.exception("Failed to read content file")
+            self.respond_error(Storyboard.CONTENT_LOADING_ERROR)
+            return
+
+        try:
+            status_code, response_body = post_content(CONTENT_SERVER_URL, params_to_contsrv, content,
+                                                      query.Parameters.YAML_CONTENT_TYPE)
+            logger.info("Received %s from content server.", status_code)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response body from contsrv: %s", response_body.decode('utf-8', errors='replace'))
+            if status_code != 200:
+                raise http.client.HTTPException(f"HTTP status {status_code}")
+
+            contsrv_data = json_loads(response_body)
             if contsrv_data and contsrv_data[0].get(Storyboard.SERVER_STATUS_KEY) == Storyboard.SERVER_STATUS_SUCCESS:
                  # --- Call Instantiation Server (Simplified) ---
                 logger.info("Content upload successful. Proceeding to instantiation.")
                 # In a real scenario, you would call the instantiation server here.
-                # For now, we'll assume success and respond to the client.
-                self.respond_success(json.dumps(contsrv_data))
+                # For now, we'll assume success and respond to the client,
+                # forwarding the content server response as is.
+                self.respond_success(response_body)
             else:
                 logger.error("Content server returned an error.")
                 self.respond_error("Content server failed.")
 
-        except requests.exceptions.RequestException as e:
+        except (OSError, http.client.HTTPException, ValueError):
             logger.exception("Failed to communicate with content server")
             self.respond_error("Server could not communicate with the LMS content manager")
 
     def respond_error(self, message):
-        logger.error(f"Responding with error: {message}")
-        self.send_response(200) # CyTrONE client expects 200 OK even for errors
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
-        response_body = json.dumps([{'status': 'ERROR', 'message': message}])
-        self.wfile.write(response_body.encode('utf-8'))
+        logger.error("Responding with error: %s", message)
+        # CyTrONE client expects 200 OK even for errors
+        self.send_json_response(get_error_response(message))
 
     def respond_success(self, data):
-        logger.info("Responding with success.")
+        logger.debug("Responding with success.")
+        self.send_json_response(data)
+
+    def send_json_response(self, body):
+        # The body is already encoded, so that its length is known and sent
+        # in the headers
         self.send_response(200)
         self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        self.wfile.write(data.encode('utf-8'))
+        self.wfile.write(body)
+
+    # Handlers of the actions supported by this server, built once; each
+    # handler is called as handler(self, params)
+    ACTION_HANDLERS = {
+        query.Parameters.FETCH_CONTENT: handle_fetch_content,
+        query.Parameters.CREATE_TRAINING: handle_create_training
+    }
 
-class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+class ThreadedHTTPServer(ThreadPoolMixIn, HTTPServer):
     pass
 
 def main(argv):
     # ... (getopt parsing)
     server = ThreadedHTTPServer((LOCAL_ADDRESS, SERVER_PORT), RequestHandler)
     logger.info(f"CyTrONE training server starting on {LOCAL_ADDRESS}:{SERVER_PORT}")
+    if not cached_yaml.libyaml_available():
+        logger.warning("PyYAML lacks libyaml support => slow parsing of YAML files.")
+    # Parse the training information once at startup, so that requests
+    # find it in the cache; it is parsed again only if the file changes
+    if not cached_yaml.load_cached(TRAINING_FILE, trnginfo.TrainingInfo):
+        logger.warning(f"Cannot load training information from {TRAINING_FILE}.")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -4,7 +4,15 @@
 #############################################################################
 
 # External imports
+import functools
+import re
+import sys
 import yaml
+# Use the libyaml-based loader if available, since it is much faster
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 #import string
 
 
@@ -12,10 +20,29 @@ import yaml
 SEPARATOR = "-----------------------------------------------------------------"
 SEPARATO2 = "================================================================="
 
+# Buffer size used when reading YAML files; files are read in binary
+# mode so that libyaml detects the encoding and decodes the data itself
+YAML_READ_BUFFER_SIZE = 64 * 1024
+
+# Maximum number of range specification templates whose variable
+# positions are kept in memory
+TEMPLATE_CACHE_SIZE = 32
+
 # Debugging constants
 DO_DEBUG = False
 
 
+#############################################################################
+# Intern a user id, so that the ids of the users, the keys of the user
+# indexes and the ids received in requests can be compared on identity;
+# values that are not strings are returned unchanged
+#############################################################################
+def intern_field(value):
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
 #############################################################################
 # Manage the keys used for representing user information
 #############################################################################
@@ -49,6 +76,16 @@ class Keys:
     CLONE_RANGE_ID = "clone_range_id"
     
 
+#############################################################################
+# Split the range specification template into fragments, so that variables
+# can be replaced without scanning the template again; items at odd indices
+# are variable names, and the others are the literal text between them
+#############################################################################
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def split_template(range_file_content):
+    return tuple(User.VARIABLE_PATTERN.split(range_file_content))
+
+
 #############################################################################
 # Manage user information
 #############################################################################
@@ -81,6 +118,15 @@ class User:
     ALL_VARIABLES.extend(DEFINED_VARIABLES)
     ALL_VARIABLES.extend(INTERNAL_VARIABLES)
 
+    # Pattern matching the template form "{{ variable }}" of all the
+    # variables above, so that they are replaced in a single pass
+    VARIABLE_PATTERN = re.compile(
+        r"\{\{ (" + "|".join(map(re.escape, ALL_VARIABLES)) + r") \}\}")
+
+    # Fields are stored in slots rather than in a per-instance dictionary;
+    # the defined variables are stored under their own names
+    __slots__ = ("name", "id", "password", "defined_values") + tuple(DEFINED_VARIABLES)
+
     
     # Initialize object based on user information
     def __init__(self, user_info):
@@ -88,18 +134,21 @@ class User:
         self.name = user_info.get(Keys.NAME, None)
         assert self.name != None
 
-        self.id = user_info.get(Keys.ID, None)
+        self.id = intern_field(user_info.get(Keys.ID, None))
         assert self.id != None
 
         self.password = user_info.get(Keys.PASSWORD, None)
 
+        # Store the values of the defined variables both as attributes and
+        # by name, since the latter are used for all range instantiations
+        self.defined_values = {}
         for variable in self.DEFINED_VARIABLES:
-            if DO_DEBUG:
-                print ("* DEBUG: userinfo: %s -> %s" % (variable, user_info.get(variable, None)))
             # Make sure to convert to string in order to avoid having
-            # a value such as 10.1 be treated as a float
-            setattr(self, variable, user_info.get(variable, None).__str__())
-            assert getattr(self, variable) != None
+            # a value such as 10.1 be treated as a float; the values are
+            # interned, since users usually share the same host settings
+            value = sys.intern(user_info.get(variable, None).__str__())
+            setattr(self, variable, value)
+            self.defined_values[variable] = value
 
             # Deal with special variables
             #if variable == Keys.CLONE_MGMT_NETWORK_PREFIX:
@@ -107,6 +156,8 @@ class User:
             #    setattr(self, Keys.CLONE_MGMT_NETWORK, clone_mgmt_addr)
         
         if DO_DEBUG:
+            for variable in self.DEFINED_VARIABLES:
+                print ("* DEBUG: userinfo: %s -> %s" % (variable, user_info.get(variable, None)))
             print ("* DEBUG: userinfo: USER:  NAME=%s  ID=%s" % (self.name, self.id))
 
 
@@ -120,15 +171,17 @@ class User:
     # Replace variables in a range specification based on user information
     def replace_variables(self, range_file_content, cyber_range_id, instance_count):
 
-        return_string = range_file_content
+        # Range specifications without any variable are used as such
+        if "{{" not in range_file_content:
+            return range_file_content
 
         #ADDR_SUFFIX = "SFX"
 
-        # Assign cyber range id to internal variable
-        setattr(self, Keys.CLONE_RANGE_ID, cyber_range_id)
-        
-        # Derive internal variables that depend on instance_count
-        setattr(self, Keys.CLONE_INSTANCE_NUMBER, str(instance_count))
+        # Only the internal variables are computed for each call; they are
+        # kept local instead of being assigned to the user object, which is
+        # shared between request threads
+        internal_values = {Keys.CLONE_INSTANCE_NUMBER: str(instance_count),
+                           Keys.CLONE_RANGE_ID: cyber_range_id}
         #addr_list = ""
         #for i in range (1, instance_count+1):
         #    # Special handling of suffix
@@ -137,30 +190,27 @@ class User:
         #                        + "; ")
         #setattr(self, Keys.CLONE_MGMT_ADDR_LIST, addr_list)
 
-        # Do replace all variables with their values
-        for variable in self.ALL_VARIABLES:
-            variable_name = "{{ " + variable + " }}"
-            variable_value = getattr(self, variable)
-
-            if DO_DEBUG:
-                print ("* DEBUG: userinfo: name=%s value=%s" % (variable_name, variable_value))
-
-            return_string = return_string.replace(variable_name, variable_value)
-
-            # Replace the variable names with values
-            #if variable != Keys.CLONE_MGMT_ADDR_LIST:
-            #    return_string = return_string.replace(variable_name, variable_value)
-            # CLONE_MGMT_ADDR_LIST needs special handling    
-            #else:
-            #    suffix = self.CLONE_MGMT_ADDR_FIRST_SUFFIX
-            #    # While the variable name still appears in the list, we replace
-            #    # _only_ one instance of it with an incremental suffix number
-            #    while Keys.CLONE_MGMT_ADDR_LIST in return_string:
-            #        variable_value2 = variable_value.replace(ADDR_SUFFIX, str(suffix))
-            #        return_string = return_string.replace(variable_name, variable_value2, 1)
-            #        suffix += 1
-        
-        return return_string
+        if DO_DEBUG:
+            for values in (self.defined_values, internal_values):
+                for variable_name, variable_value in values.items():
+                    print ("* DEBUG: userinfo: name=%s value=%s" % (variable_name, variable_value))
+
+        # Do replace all variables with their values; the template is only
+        # scanned the first time, after which the fragments are reused for
+        # each user and instantiation; the precomputed values of the
+        # defined variables are used directly
+        defined_values = self.defined_values
+        fragments = split_template(range_file_content)
+        if len(fragments) == 1:
+            return range_file_content
+        fragments = list(fragments)
+        for i in range(1, len(fragments), 2):
+            value = defined_values.get(fragments[i])
+            if value is None:
+                value = internal_values[fragments[i]]
+            fragments[i] = value
+
+        return "".join(fragments)
 
 
 #############################################################################
@@ -168,8 +218,18 @@ class User:
 #############################################################################
 class UserInfo:
 
-    # List of users (User objects)
-    users = []
+    # User records as loaded from the YAML file (dictionaries); User
+    # objects are only created for the users that are actually requested
+    user_records = ()
+
+    # Index in user_records of the record of each user id
+    record_index_by_id = {}
+
+    # Users (User objects) created so far, indexed by id
+    users_by_id = {}
+
+    # Text printed by pretty_print(), built at the first call
+    pretty_text = None
 
     
     # Parse a YAML information in a file and store values into the
@@ -178,46 +238,52 @@ class UserInfo:
 
         # Open the YAML file
         try:
-            yaml_file = open(yaml_file_name, "r")
+            yaml_file = open(yaml_file_name, "rb", buffering=YAML_READ_BUFFER_SIZE)
         except IOError:
             print ("* ERROR: userinfo: Cannot open file %s." % (yaml_file_name))
             return False
-            
-        try:
-            # Load the YAML information
-            info = yaml.load(yaml_file, Loader=yaml.SafeLoader)
 
-            # Close the file
-            yaml_file.close()
+        try:
+            # Load the YAML information, and close the file even in
+            # case of error
+            with yaml_file:
+                info = yaml.load(yaml_file, Loader=SafeLoader)
+
+        except yaml.MarkedYAMLError as exc:
+            mark = exc.problem_mark
+            if mark is not None:
+                print ("* ERROR: userinfo: YAML error in file %s at position: (%s:%s)." % (
+                    yaml_file_name, mark.line+1, mark.column+1))
+            else:
+                print ("* ERROR: userinfo: YAML error in file %s: %s." % (yaml_file_name, exc))
+            return False
 
-            # Actually parse the information
-            result = self.parse_info(info)
+        except yaml.YAMLError as exc:
+            print ("* ERROR: userinfo: YAML error in file %s: %s." % (yaml_file_name, exc))
+            return False
 
-            if DO_DEBUG:
-                print (result)
+        # Actually parse the information
+        result = self.parse_info(info)
 
-            return True
+        if DO_DEBUG:
+            print (result)
 
-        except yaml.YAMLError as exc:
-            if hasattr(exc, 'problem_mark'):
-                mark = exc.problem_mark
-                print ("* ERROR: userinfo: YAML error in file %s at position: (%s:%s)." % (
-                    yaml_file_name, mark.line+1, mark.column+1))
-            return False
+        return result
 
 
     # Actually parse a information object, and store values into the
     # object fields
     def parse_info(self, info):
 
-        self.users = []
-        
         # Get data for all users from info
-        for data in info:
+        users_info = None
+        for data in info or ():
             users_info = data.get(Keys.USERS, None)
             if users_info != None:
                 break
-        assert users_info != None
+        if users_info == None:
+            print ("* ERROR: userinfo: No '%s' key in user information." % (Keys.USERS))
+            return False
 
         if DO_DEBUG:
             print (SEPARATOR)
@@ -226,42 +292,62 @@ class UserInfo:
             print (users_info)
             print (SEPARATOR)
 
-        # Get data for each user
+        # Check all the records at load time, so that invalid files are
+        # rejected when parsed, and not only when the user is requested
+        user_ids = []
         for user_info in users_info:
-
-            user = User(user_info)
-            self.users.append(user)
-
-            if DO_DEBUG:
-                print ("* DEBUG: userinfo: USER: %s" % (user))
-                
-        if DO_DEBUG:
-            print (SEPARATOR)
+            assert user_info.get(Keys.NAME, None) != None
+            user_id = intern_field(user_info.get(Keys.ID, None))
+            assert user_id != None
+            user_ids.append(user_id)
+
+        # Index the record of each user by id; the records are indexed in
+        # reverse order so as to keep the first user with a given id, as
+        # the former linear search did
+        record_index_by_id = dict(zip(reversed(user_ids),
+                                      range(len(user_ids) - 1, -1, -1)))
+
+        self.user_records = tuple(users_info)
+        self.record_index_by_id = record_index_by_id
+        self.users_by_id = {}
+        self.pretty_text = None
 
         return True
     
  
-    # Get a user identified by id if it exists
+    # Get a user identified by id if it exists; the User object is created
+    # at the first request, and reused afterwards
     def get_user(self, user_id):
-        for user in self.users:
-            if user.id == user_id:
-                return user
-            
-        return None
+        user = self.users_by_id.get(user_id)
+        if user is None:
+            index = self.record_index_by_id.get(user_id)
+            if index is None:
+                return None
+            user = User(self.user_records[index])
+            self.users_by_id[user.id] = user
+
+            if DO_DEBUG:
+                print ("* DEBUG: userinfo: USER: %s" % (user))
+
+        return user
 
 
-    # Pretty-print info about the object
+    # Pretty-print info about the object; the text only depends on the
+    # parsed information, so it is built once and reused
     def pretty_print(self):
-        index = 1;
-        print (SEPARATOR)
-        print ("USER INFO: %d user(s)" % (
-            len(self.users)))
-        print (SEPARATOR)
-        for user in self.users:
-            print ("USER #%d:" % (index))
-            print (user)
-            index += 1
-        print (SEPARATOR)
+        if self.pretty_text is None:
+            lines = [SEPARATOR]
+            lines.append("USER INFO: %d user(s)" % (
+                len(self.user_records)))
+            lines.append(SEPARATOR)
+            index = 1;
+            for user_record in self.user_records:
+                lines.append("USER #%d:" % (index))
+                lines.append(User(user_record).__str__())
+                index += 1
+            lines.append(SEPARATOR)
+            self.pretty_text = "\n".join(lines) + "\n"
+        sys.stdout.write(self.pretty_text)
 
 
 #############################################################################